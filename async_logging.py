@@ -0,0 +1,112 @@
+"""非阻塞的日誌輸出
+
+監控迴圈 (get_log 輪詢、CDP 事件回呼、探測執行緒) 上的 print 與日誌檔
+寫入都是同步的，磁碟或主控台一慢就會延後下一次輪詢。start() 之後:
+
+- root logger 與 error_logger 原本的 handler 改由背景 QueueListener 執行，
+  呼叫端只把記錄放進有上限的佇列
+- 主控台訊息改用 console() 送到 'console' logger，同樣經由佇列輸出
+- 佇列滿時直接丟棄並累加 dropped，不會讓呼叫端等待
+
+各佇列的深度、最大深度與丟棄數可由 stats_sources() 登記到
+stream_metrics 的 /metrics。
+"""
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+CONSOLE_LOGGER = 'console'
+ERROR_LOGGER = 'error_logger'
+
+_listeners = []
+_handlers = {}    # 佇列名稱 -> DroppingQueueHandler
+_lock = threading.Lock()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """佇列滿時丟棄記錄而不是阻塞或拋出例外"""
+
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self.capacity = maxsize
+        self.dropped = 0
+        self.max_depth = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def stats(self):
+        return {
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'dropped': self.dropped,
+            'capacity': self.capacity,
+        }
+
+
+def _console_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
+
+
+def _move_to_queue(name, logger, maxsize):
+    """把 logger 現有的 handler 移到背景 QueueListener，換上 DroppingQueueHandler"""
+    handlers = list(logger.handlers)
+    if not handlers:
+        return
+    for handler in handlers:
+        logger.removeHandler(handler)
+    queue_handler = DroppingQueueHandler(maxsize)
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    logger.addHandler(queue_handler)
+    _listeners.append(listener)
+    _handlers[name] = queue_handler
+
+
+def start(maxsize=10000):
+    """將日誌與主控台輸出改為背景執行，重複呼叫無作用"""
+    with _lock:
+        if _listeners:
+            return
+        console_logger = logging.getLogger(CONSOLE_LOGGER)
+        console_logger.setLevel(logging.INFO)
+        console_logger.propagate = False
+        if not console_logger.handlers:
+            console_logger.addHandler(_console_handler())
+        _move_to_queue('console', console_logger, maxsize)
+        _move_to_queue('log', logging.getLogger(), maxsize)
+        _move_to_queue('error_log', logging.getLogger(ERROR_LOGGER), maxsize)
+        atexit.register(stop)
+
+
+def stop():
+    """停止背景輸出，先把佇列中剩下的記錄寫完"""
+    with _lock:
+        while _listeners:
+            _listeners.pop().stop()
+
+
+def console(message):
+    """輸出到主控台；start() 之後只會放進佇列"""
+    logger = logging.getLogger(CONSOLE_LOGGER)
+    if logger.handlers:
+        logger.info(message)
+    else:
+        print(message)
+
+
+def stats_sources():
+    """佇列名稱 -> 回傳該佇列統計的函式，供 MetricsCollector.add_queue 使用"""
+    return {name: handler.stats for name, handler in _handlers.items()}
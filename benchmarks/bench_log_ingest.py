@@ -0,0 +1,142 @@
+"""performance log 過濾/解碼的微基準測試
+
+比較舊做法 (每筆都 json.loads 後再判斷 method 與網址) 與 LogIngestor
+(先以字串過濾再解碼) 的每筆事件成本。
+
+    python benchmarks/bench_log_ingest.py
+    python benchmarks/bench_log_ingest.py --corpus logs/capture.jsonl.gz
+
+--corpus 為每行一筆 get_log('performance') 記錄的 JSONL (可為 gzip)；
+未指定時產生模擬忙碌頁面 (廣告、分析、播放器) 的合成資料。
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_ingest import LogIngestor  # noqa: E402
+
+
+def _entry(method, params, webview='A1B2C3'):
+    message = {'message': {'method': method, 'params': params}, 'webview': webview}
+    return {
+        'level': 'INFO',
+        'message': json.dumps(message, separators=(',', ':'), sort_keys=True),
+        'timestamp': int(time.time() * 1000),
+    }
+
+
+def synthetic_corpus(count=50000, media_ratio=0.1, seed=1):
+    """產生近似 ChromeDriver 輸出格式的合成 performance log"""
+    rng = random.Random(seed)
+    headers = {f'x-header-{i}': 'v' * rng.randint(10, 80) for i in range(25)}
+    stack = {'callFrames': [{'functionName': f'fn{i}', 'url': f'https://cdn.example.com/app.{i}.js',
+                             'lineNumber': i, 'columnNumber': i * 7} for i in range(30)]}
+    noise_methods = ('Network.dataReceived', 'Network.requestWillBeSentExtraInfo',
+                     'Network.responseReceivedExtraInfo', 'Page.frameNavigated',
+                     'Network.resourceChangedPriority')
+    entries = []
+    request_id = 0
+    while len(entries) < count:
+        request_id += 1
+        rid = f'1000.{request_id}'
+        media = rng.random() < media_ratio
+        if media:
+            sequence = request_id
+            url = f'http://192.168.31.101/Media1/live/cam14/seg{sequence}.ts'
+        else:
+            url = f'https://ads.example.com/pixel/{request_id}?{"&".join(f"k{i}=v{i}" for i in range(20))}'
+        entries.append(_entry('Network.requestWillBeSent', {
+            'requestId': rid, 'request': {'url': url, 'method': 'GET', 'headers': headers},
+            'initiator': {'type': 'script', 'stack': stack}, 'timestamp': request_id / 10,
+        }))
+        for _ in range(rng.randint(1, 4)):
+            entries.append(_entry(rng.choice(noise_methods), {'requestId': rid, 'headers': headers}))
+        status = 404 if media and rng.random() < 0.05 else 200
+        entries.append(_entry('Network.responseReceived', {
+            'requestId': rid, 'timestamp': request_id / 10 + 0.05, 'type': 'Media' if media else 'Image',
+            'response': {'url': url, 'status': status, 'headers': headers,
+                         'timing': {'requestTime': request_id / 10, 'sendStart': 0.5,
+                                    'receiveHeadersEnd': 20.0}},
+        }))
+        entries.append(_entry('Network.loadingFinished', {
+            'requestId': rid, 'timestamp': request_id / 10 + 0.3, 'encodedDataLength': 500000,
+        }))
+    return entries[:count]
+
+
+def load_corpus(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    entries = []
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                # 錄製檔也可能包含 CDP 事件，只取 performance log 記錄
+                if 'message' in record:
+                    entries.append(record)
+    return entries
+
+
+def baseline(entries):
+    """舊版 process_browser_logs 的做法: 全部解碼後再判斷"""
+    events = []
+    for entry in entries:
+        try:
+            log = json.loads(entry['message'])['message']
+        except json.JSONDecodeError:
+            continue
+        method = log['method']
+        if method == 'Network.responseReceived':
+            url = log['params']['response']['url']
+            if '/Media1/live/' in url:
+                events.append((method, log['params']))
+        elif method in ('Network.loadingFailed', 'Network.loadingFinished'):
+            events.append((method, log['params']))
+    return events
+
+
+def fast_path(entries):
+    return LogIngestor().ingest(entries)
+
+
+def measure(func, entries, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(entries)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='performance log 過濾/解碼微基準測試')
+    parser.add_argument('--corpus', help='錄製的 performance log (JSONL 或 JSONL.gz)')
+    parser.add_argument('--count', type=int, default=50000, help='合成資料筆數')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    entries = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.count)
+    size = sum(len(entry['message']) for entry in entries)
+    print(f'事件數: {len(entries)}，平均大小: {size / max(1, len(entries)):.0f} bytes')
+
+    base_time, base_events = measure(baseline, entries, args.repeat)
+    fast_time, fast_events = measure(fast_path, entries, args.repeat)
+    base_media = sum(1 for method, _ in base_events if method == 'Network.responseReceived')
+    fast_media = sum(1 for _, method, _ in fast_events if method == 'Network.responseReceived')
+
+    for name, elapsed in (('全部解碼', base_time), ('字串預先過濾', fast_time)):
+        print(f'{name:<8} {elapsed * 1e9 / len(entries):8.0f} ns/事件  '
+              f'{len(entries) / elapsed:12.0f} 事件/秒')
+    print(f'加速: {base_time / fast_time:.1f}x，串流回應: 全部解碼 {base_media} / 預先過濾 {fast_media}')
+
+
+if __name__ == '__main__':
+    main()
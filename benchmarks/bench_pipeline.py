@@ -0,0 +1,255 @@
+"""監控流程的離線基準測試
+
+不需要網站或 Chrome，分成五項:
+
+    events   以 ReplayDriver 重播 performance log，量測 process_browser_logs 的事件/秒
+    errors   ErrorStore 寫入錯誤記錄的筆數/秒 (含與不含 fsync) 與 BackgroundWriter 的呼叫端成本
+    memory   以加速重播模擬 24 小時的串流流量，每個模擬小時記錄 Python 配置的記憶體與 RSS
+    probe    對本機 HLS 測試伺服器 (hls_server.py) 執行 HLSProbe，量測事件/秒
+    incidents  片段持續 404 而播放清單仍正常更新時，檢查錯誤事件只寫入首筆與恢復彙總
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py events --corpus logs/capture.jsonl.gz
+    python benchmarks/bench_pipeline.py memory --hours 24 --streams 8
+    python benchmarks/bench_pipeline.py incidents
+
+錄製檔以 python website_monitor.py --capture logs/capture.jsonl.gz 產生。
+probe 需要 requests。
+所有輸出檔 (logs/) 都寫在暫存目錄，不會動到實際的錯誤記錄。
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_log_ingest import _entry, synthetic_corpus  # noqa: E402
+from error_store import BackgroundWriter, ErrorStore, iter_errors  # noqa: E402
+from replay import ReplayDriver, read_capture  # noqa: E402
+from resource_usage import _proc_rss  # noqa: E402
+
+
+def _monitor():
+    # setup_logging 會在目前目錄建立 logs/，因此先切換到暫存目錄；
+    # 共用的錯誤記錄只建立一次，同一次執行的各項目都使用同一個目錄
+    if 'website_monitor' not in sys.modules:
+        os.chdir(tempfile.mkdtemp(prefix='bench-pipeline-'))
+    import website_monitor
+    website_monitor.setup_logging()
+    return website_monitor
+
+
+def hour_of_traffic(hour, streams, segment_seconds=2.0, error_rate=0.01, noise=2):
+    """一個模擬小時的 performance log: 每個串流每 segment_seconds 一個片段"""
+    entries = []
+    segments = int(3600 / segment_seconds)
+    for index in range(segments):
+        clock = hour * 3600 + index * segment_seconds
+        sequence = hour * segments + index
+        for stream in range(streams):
+            rid = f'{stream}.{sequence}'
+            url = f'http://127.0.0.1:8080/Media1/live/cam{stream}/seg{sequence}.ts'
+            entries.append(_entry('Network.requestWillBeSent', {
+                'requestId': rid, 'request': {'url': url, 'method': 'GET'}, 'timestamp': clock,
+            }))
+            for _ in range(noise):
+                entries.append(_entry('Network.dataReceived', {'requestId': rid, 'dataLength': 65536}))
+            failed = (sequence * streams + stream) % int(1 / error_rate) == 0 if error_rate else False
+            entries.append(_entry('Network.responseReceived', {
+                'requestId': rid, 'timestamp': clock + 0.05, 'type': 'Media',
+                'response': {'url': url, 'status': 404 if failed else 200,
+                             'headers': {'content-type': 'video/mp2t'},
+                             'timing': {'requestTime': clock, 'sendStart': 0.5,
+                                        'receiveHeadersEnd': 20.0}},
+            }))
+            entries.append(_entry('Network.loadingFinished', {
+                'requestId': rid, 'timestamp': clock + 0.3, 'encodedDataLength': 188000,
+            }))
+    return entries
+
+
+def outage_traffic(failed=30, refreshes=200, recovered=3):
+    """片段連續 404，期間播放清單照常回應 200，最後片段恢復"""
+    entries = []
+
+    def request(rid, url, status):
+        entries.append(_entry('Network.requestWillBeSent', {
+            'requestId': rid, 'request': {'url': url, 'method': 'GET'},
+        }))
+        entries.append(_entry('Network.responseReceived', {
+            'requestId': rid, 'type': 'Media',
+            'response': {'url': url, 'status': status, 'headers': {}},
+        }))
+
+    playlist = 'http://127.0.0.1:8080/Media1/live/cam0/index.m3u8'
+    for index in range(refreshes):
+        request(f'p{index}', playlist, 200)
+        if index * failed // refreshes != (index + 1) * failed // refreshes:
+            request(f's{index}', f'http://127.0.0.1:8080/Media1/live/cam0/seg{index}.ts', 404)
+    for index in range(recovered):
+        request(f'r{index}', f'http://127.0.0.1:8080/Media1/live/cam0/ok{index}.ts', 200)
+    return entries
+
+
+def drain(monitor, driver):
+    while not driver.finished:
+        monitor.process_browser_logs(driver)
+        monitor.maybe_flush_errors()
+
+
+def bench_events(args):
+    # _monitor() 會切換目錄，先把錄製檔轉成絕對路徑
+    corpus = os.path.abspath(args.corpus) if args.corpus else None
+    monitor = _monitor()
+    # 錄製檔中的 CDP 事件由 ReplayDriver 轉成 performance log 格式一併重播
+    entries = list(read_capture(corpus)) if corpus else synthetic_corpus(args.count)
+    driver = ReplayDriver(records=entries, speed=0, batch_size=args.batch_size)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        drain(monitor, driver)
+        monitor.flush_errors()
+    elapsed = time.perf_counter() - started
+    print(f'[events] {len(entries)} 筆事件，{elapsed:.2f} 秒，'
+          f'{len(entries) / elapsed:.0f} 事件/秒，寫入錯誤 {monitor.get_default_store().written} 筆')
+
+
+def bench_errors(args):
+    record = {
+        'timestamp': '2025-01-10T00:00:00',
+        'file_name': 'seg1.ts',
+        'url': 'http://127.0.0.1:8080/Media1/live/cam1/seg1.ts',
+        'status': 404,
+        'content_type': 'text/plain',
+        'headers': {f'x-header-{i}': 'v' * 40 for i in range(10)},
+        'error_type': 'STREAM_ERROR',
+    }
+    directory = tempfile.mkdtemp(prefix='bench-errors-')
+    for fsync in (False, True):
+        store = ErrorStore(os.path.join(directory, f'errors-{int(fsync)}.jsonl'), fsync=fsync)
+        started = time.perf_counter()
+        for _ in range(args.records):
+            store.append(record)
+        store.close()
+        elapsed = time.perf_counter() - started
+        print(f'[errors] fsync={str(fsync):<5} {args.records} 筆，{elapsed:.2f} 秒，'
+              f'{args.records / elapsed:.0f} 筆/秒')
+
+    # 監控程式實際使用的 BackgroundWriter: 呼叫端只放進佇列
+    writer = BackgroundWriter(ErrorStore(os.path.join(directory, 'errors-background.jsonl')),
+                              maxsize=args.records)
+    started = time.perf_counter()
+    for _ in range(args.records):
+        writer.append(record)
+    enqueued = time.perf_counter() - started
+    writer.close()
+    elapsed = time.perf_counter() - started
+    print(f'[errors] background  {args.records} 筆，呼叫端 {enqueued * 1e6 / args.records:.1f} us/筆，'
+          f'寫完 {elapsed:.2f} 秒，丟棄 {writer.dropped} 筆')
+
+
+def bench_memory(args):
+    monitor = _monitor()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    pid = os.getpid()
+    started = time.perf_counter()
+    events = 0
+    print(f'[memory] {args.streams} 個串流，模擬 {args.hours} 小時')
+    print(f'{"小時":>4} {"事件數":>10} {"Python配置(MB)":>14} {"RSS(MB)":>9}')
+    for hour in range(args.hours):
+        entries = hour_of_traffic(hour, args.streams)
+        events += len(entries)
+        driver = ReplayDriver(records=entries, speed=0, batch_size=args.batch_size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain(monitor, driver)
+        del driver, entries
+        current = tracemalloc.get_traced_memory()[0] - baseline
+        print(f'{hour + 1:>4} {events:>10} {current / 1024 / 1024:>14.2f} '
+              f'{_proc_rss(pid) / 1024 / 1024:>9.1f}')
+    monitor.flush_errors()
+    tracemalloc.stop()
+    print(f'[memory] 總計 {events} 筆事件，{time.perf_counter() - started:.1f} 秒')
+
+
+def bench_incidents(args):
+    monitor = _monitor()
+    store = monitor.get_default_store()
+    monitor.flush_errors()
+    before = store.written
+    driver = ReplayDriver(records=outage_traffic(), speed=0, batch_size=args.batch_size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        drain(monitor, driver)
+        monitor.flush_errors()
+    records = list(iter_errors(store.store.path))[before:]
+    # 只有首筆錯誤與片段恢復時的彙總；播放清單的 200 不應提前結束事件
+    resolutions = [record.get('resolution', record['error_type']) for record in records]
+    print(f'[incidents] 30 個片段 404 / 200 次播放清單更新，寫入 {len(records)} 筆: {resolutions}')
+    if resolutions != ['STREAM_ERROR', 'recovered']:
+        raise SystemExit('[incidents] 錯誤事件合併異常，預期只有首筆錯誤與恢復彙總')
+
+
+def bench_probe(args):
+    import hls_probe
+    from hls_server import HLSServer
+
+    server = HLSServer(target_duration=args.target_duration, error_rate=args.error_rate).start()
+    counts = {'events': 0, 'errors': 0}
+
+    def on_event(method, params, stream=None):
+        counts['events'] += 1
+
+    def on_error(error_data):
+        counts['errors'] += 1
+
+    probe = hls_probe.HLSProbe(on_event, on_error, min_interval=args.target_duration / 2)
+    probe.login(server.url, 'admin', '')
+    for index in range(args.streams):
+        probe.add(f'cam{index}', f'{server.url}/Media1/live/cam{index}/index.m3u8')
+    probe.start()
+    time.sleep(args.seconds)
+    probe.stop()
+    server.stop()
+    print(f'[probe] {args.streams} 個串流，{args.seconds:.0f} 秒，伺服器請求 {server.requests} 次，'
+          f'事件 {counts["events"] / args.seconds:.0f} 個/秒，停滯記錄 {counts["errors"]} 筆')
+
+
+BENCHMARKS = {
+    'events': bench_events,
+    'errors': bench_errors,
+    'memory': bench_memory,
+    'probe': bench_probe,
+    'incidents': bench_incidents,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='監控流程離線基準測試')
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f'要執行的項目 ({" ".join(BENCHMARKS)})，預設為 events errors memory')
+    parser.add_argument('--corpus', help='錄製檔 (JSONL 或 JSONL.gz)，預設使用合成資料')
+    parser.add_argument('--count', type=int, default=50000, help='合成資料筆數')
+    parser.add_argument('--batch-size', type=int, default=1000, help='每次 get_log 回傳的筆數')
+    parser.add_argument('--records', type=int, default=20000, help='錯誤記錄寫入筆數')
+    parser.add_argument('--hours', type=int, default=24, help='記憶體測試模擬的小時數')
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10, help='probe 執行秒數')
+    parser.add_argument('--target-duration', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f'未知的項目: {name}')
+
+    for name in args.benchmarks or ('events', 'errors', 'memory'):
+        BENCHMARKS[name](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""本機 HLS 測試伺服器，取代 192.168.31.101 供離線測試與基準測試使用
+
+提供與正式網站相同路徑的最小功能:
+
+- POST /APIPath/api/user/login        回傳 {"data": {"token": ...}}
+- GET  /Media1/live/<名稱>/index.m3u8  每 target_duration 秒前進一個片段的直播清單
+- GET/HEAD /Media1/live/<名稱>/seg<N>.ts  片段內容，依 error_rate 隨機回應 404
+
+    python benchmarks/hls_server.py --port 8080 --error-rate 0.05
+    python website_monitor.py --profile monitor http://127.0.0.1:8080/Media1/live/cam1/index.m3u8
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class HLSServer:
+    def __init__(self, host='127.0.0.1', port=0, target_duration=2.0, window=5,
+                 segment_bytes=188 * 1000, error_rate=0.0, seed=None):
+        self.target_duration = target_duration
+        self.window = window                # 播放清單保留的片段數
+        self.segment_bytes = segment_bytes
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self._payload = b'\x47' * segment_bytes
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def sequence(self):
+        return int((time.monotonic() - self.started) / self.target_duration)
+
+    def playlist(self):
+        last = self.sequence()
+        first = max(0, last - self.window + 1)
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.target_duration:g}',
+            f'#EXT-X-MEDIA-SEQUENCE:{first}',
+        ]
+        for sequence in range(first, last + 1):
+            lines.append(f'#EXTINF:{self.target_duration:.3f},')
+            lines.append(f'seg{sequence}.ts')
+        return '\n'.join(lines) + '\n'
+
+    def _fail(self):
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate and self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, content_type, body, include_body=True):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(body)
+
+            def _media(self, include_body):
+                path = self.path.split('?', 1)[0]
+                if not path.startswith('/Media1/live/'):
+                    self._send(404, 'text/plain', b'not found', include_body)
+                elif path.endswith('.m3u8'):
+                    body = server.playlist().encode('ascii')
+                    self._send(200, 'application/vnd.apple.mpegurl', body, include_body)
+                elif path.endswith('.ts'):
+                    if server._fail():
+                        self._send(404, 'text/plain', b'segment not found', include_body)
+                    else:
+                        self._send(200, 'video/mp2t', server._payload, include_body)
+                else:
+                    self._send(404, 'text/plain', b'not found', include_body)
+
+            def do_GET(self):
+                self._media(True)
+
+            def do_HEAD(self):
+                self._media(False)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                if self.path.split('?', 1)[0] == '/APIPath/api/user/login':
+                    body = json.dumps({'data': {'token': 'local-test-token'}}).encode('utf-8')
+                    self._send(200, 'application/json', body)
+                else:
+                    self._send(404, 'text/plain', b'not found')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        name='hls-test-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本機 HLS 測試伺服器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--target-duration', type=float, default=2.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='片段回應 404 的比例')
+    args = parser.parse_args(argv)
+
+    server = HLSServer(args.host, args.port, args.target_duration, error_rate=args.error_rate)
+    print(f'HLS 測試伺服器: {server.url}/Media1/live/<名稱>/index.m3u8')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""CDP 網路事件訂閱
+
+透過 Selenium 內建的 CDP 連線 (driver.bidi_connection, 以 trio 執行) 只訂閱
+串流監控需要的 Network 事件，事件一到就處理，不再每 100 ms 輪詢一次
+get_log('performance')。
+
+CDP 的 Network.enable 沒有網址過濾參數，所以在事件交給 on_event 之前先以
+網址過濾: requestWillBeSent 只記下符合過濾條件的 requestId，之後
+responseReceived / loadingFailed / loadingFinished 只處理記下的請求，其他事件直接丟棄。
+loadingFailed 事件本身不帶網址，轉交時會補上 'url' 欄位。
+"""
+import trio
+
+MEDIA_URL_FILTER = '/Media1/live/'
+
+# 請求網址對應表的上限，避免長時間執行時無限增長
+MAX_TRACKED_REQUESTS = 10000
+
+
+def is_media_url(url, url_filter=MEDIA_URL_FILTER):
+    return url_filter in url and ('.m3u8' in url or '.ts' in url)
+
+
+async def _tick(on_tick, interval):
+    while True:
+        await trio.sleep(interval)
+        on_tick()
+
+
+async def _listen(driver, on_event, url_filter, on_tick, tick_interval, buffer_size, duration):
+    with trio.move_on_after(duration if duration is not None else float('inf')):
+        await _subscribe(driver, on_event, url_filter, on_tick, tick_interval, buffer_size)
+
+
+async def _subscribe(driver, on_event, url_filter, on_tick, tick_interval, buffer_size):
+    async with driver.bidi_connection() as connection:
+        session, devtools = connection.session, connection.devtools
+        network = devtools.network
+        await session.execute(network.enable())
+
+        tracked = {}
+        async with trio.open_nursery() as nursery:
+            if on_tick is not None:
+                nursery.start_soon(_tick, on_tick, tick_interval)
+
+            events = session.listen(
+                network.RequestWillBeSent,
+                network.ResponseReceived,
+                network.LoadingFailed,
+                network.LoadingFinished,
+                buffer_size=buffer_size,
+            )
+            async for event in events:
+                request_id = str(event.request_id)
+                if isinstance(event, network.RequestWillBeSent):
+                    if is_media_url(event.request.url, url_filter):
+                        if len(tracked) >= MAX_TRACKED_REQUESTS:
+                            tracked.pop(next(iter(tracked)))
+                        tracked[request_id] = event.request.url
+                elif isinstance(event, network.ResponseReceived):
+                    if request_id in tracked or is_media_url(event.response.url, url_filter):
+                        on_event('Network.responseReceived', {
+                            'requestId': request_id,
+                            'timestamp': float(event.timestamp),
+                            'type': event.type_.to_json(),
+                            'response': event.response.to_json(),
+                        })
+                elif isinstance(event, network.LoadingFailed):
+                    url = tracked.pop(request_id, None)
+                    if url is not None:
+                        on_event('Network.loadingFailed', {
+                            'requestId': request_id,
+                            'timestamp': float(event.timestamp),
+                            'type': event.type_.to_json(),
+                            'url': url,
+                            'errorText': event.error_text,
+                            'canceled': event.canceled,
+                        })
+                elif isinstance(event, network.LoadingFinished):
+                    if tracked.pop(request_id, None) is not None:
+                        on_event('Network.loadingFinished', {
+                            'requestId': request_id,
+                            'timestamp': float(event.timestamp),
+                            'encodedDataLength': event.encoded_data_length,
+                        })
+            # 事件串流結束 (連線關閉) 時一併停止定期工作
+            nursery.cancel_scope.cancel()
+
+
+def listen_network_events(driver, on_event, url_filter=MEDIA_URL_FILTER,
+                          on_tick=None, tick_interval=0.5, buffer_size=1000, duration=None):
+    """阻塞執行，直到 CDP 連線中斷、發生例外或經過 duration 秒
+
+    on_event(method, params) 收到的 params 與 performance log 中
+    message['params'] 的格式相同，可以共用同一套處理邏輯。
+    on_tick 會每 tick_interval 秒被呼叫一次 (例如定期寫出錯誤緩衝區)。
+    """
+    trio.run(_listen, driver, on_event, url_filter, on_tick, tick_interval, buffer_size, duration)
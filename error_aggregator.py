@@ -0,0 +1,171 @@
+"""串流錯誤的去重與突發彙總
+
+斷線時每個失敗的片段都會產生一筆幾乎相同的錯誤。這裡以
+(stream, 資源種類, error_type, 狀態碼或 errorText) 為鍵，把同一段時間內的
+錯誤合併成一個事件 (incident)。資源種類分為 playlist (.m3u8) 與 segment (.ts):
+
+- 第一筆錯誤照常寫入 (含 headers / params)，並帶上 incident_id
+- 之後相同的錯誤只累加次數、更新最後發生時間並保留少量取樣網址
+- 同一串流、同一種類的資源連續 recover_after 次成功 (recovered)，或
+  window 秒內沒有再發生 (idle) 時，寫入一筆 STREAM_INCIDENT 彙總記錄，
+  不再包含 headers。斷線時播放清單通常仍會正常更新，因此播放清單成功
+  不會結束片段的事件
+
+因此一次斷線只會寫入兩筆記錄，而不是每個片段一筆；閒置結束的單一錯誤
+不另外寫入彙總。
+"""
+import atexit
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+from async_logging import console
+
+error_logger = logging.getLogger('error_logger')
+
+
+def resource_kind(url):
+    return 'playlist' if '.m3u8' in (url or '') else 'segment'
+
+
+class Incident:
+    def __init__(self, incident_id, key, url, max_samples):
+        self.incident_id = incident_id
+        self.stream, self.kind, self.error_type, self.reason = key
+        self.first_seen = datetime.now()
+        self.last_seen = self.first_seen
+        self.last_at = time.monotonic()
+        self.count = 1
+        self.samples = [url]
+        self.last_url = url
+        self.max_samples = max_samples
+
+    def add(self, url):
+        self.count += 1
+        self.last_seen = datetime.now()
+        self.last_at = time.monotonic()
+        self.last_url = url
+        if len(self.samples) < self.max_samples:
+            self.samples.append(url)
+
+    def summary(self, resolution):
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'error_type': 'STREAM_INCIDENT',
+            'incident_id': self.incident_id,
+            'source_error_type': self.error_type,
+            'resource_kind': self.kind,
+            'reason': self.reason,
+            'first_seen': self.first_seen.isoformat(),
+            'last_seen': self.last_seen.isoformat(),
+            'duration_seconds': round((self.last_seen - self.first_seen).total_seconds(), 1),
+            'count': self.count,
+            'sample_urls': self.samples,
+            'last_url': self.last_url,
+            'resolution': resolution,
+        }
+        if self.stream:
+            record['stream'] = self.stream
+        return record
+
+
+class ErrorAggregator:
+    """合併同一串流、同一原因的連續錯誤；可由多個執行緒同時呼叫"""
+
+    def __init__(self, save, window=60.0, max_samples=5, recover_after=3):
+        self.save = save                  # 寫入一筆錯誤記錄，例如 ErrorStore.append
+        self.window = window              # 幾秒沒有再發生視為事件結束
+        self.max_samples = max_samples    # 每個事件保留的取樣網址數
+        self.recover_after = recover_after  # 連續幾次成功才視為恢復
+        self.incidents = {}               # key -> Incident
+        self.successes = {}               # (stream, 資源種類) -> 連續成功次數
+        self.suppressed = 0               # 被合併而沒有個別寫入的錯誤數
+        self._ids = itertools.count(1)
+        self._prefix = datetime.now().strftime('%Y%m%d%H%M%S')
+        self._lock = threading.Lock()
+
+    def report(self, error_data, reason):
+        """回報一筆錯誤，是新事件的第一筆時寫入並回傳 True，否則只累加並回傳 False"""
+        url = error_data.get('url')
+        stream, kind = error_data.get('stream'), resource_kind(url)
+        key = (stream, kind, error_data['error_type'], reason)
+        with self._lock:
+            self.successes.pop((stream, kind), None)
+            incident = self.incidents.get(key)
+            if incident is not None and time.monotonic() - incident.last_at < self.window:
+                incident.add(url)
+                self.suppressed += 1
+                return False
+            expired = incident
+            incident = self.incidents[key] = Incident(
+                f'{self._prefix}-{next(self._ids)}', key, url, self.max_samples)
+        if expired is not None:
+            self._close(expired, 'idle')
+        self.save(dict(error_data, incident_id=incident.incident_id))
+        return True
+
+    def recover(self, stream=None, url=None):
+        """串流的資源回應成功時呼叫，同種類資源連續成功 recover_after 次才結束事件"""
+        if not self.incidents:
+            return
+        kind = resource_kind(url)
+        with self._lock:
+            keys = [key for key in self.incidents if key[0] == stream and key[1] == kind]
+            if not keys:
+                return
+            successes = self.successes.get((stream, kind), 0) + 1
+            if successes < self.recover_after:
+                self.successes[(stream, kind)] = successes
+                return
+            self.successes.pop((stream, kind), None)
+            closed = [self.incidents.pop(key) for key in keys]
+        for incident in closed:
+            self._close(incident, 'recovered')
+
+    def expire(self):
+        """結束超過 window 秒沒有再發生的事件，由監控迴圈定期呼叫"""
+        if not self.incidents:
+            return
+        now = time.monotonic()
+        with self._lock:
+            keys = [key for key, incident in self.incidents.items()
+                    if now - incident.last_at >= self.window]
+            closed = [self.incidents.pop(key) for key in keys]
+        for incident in closed:
+            self._close(incident, 'idle')
+
+    def close(self):
+        """結束所有進行中的事件 (程式停止時)"""
+        with self._lock:
+            closed = list(self.incidents.values())
+            self.incidents.clear()
+        for incident in closed:
+            self._close(incident, 'shutdown')
+
+    def _close(self, incident, resolution):
+        if incident.count == 1 and resolution != 'recovered':
+            # 單一筆錯誤已經完整寫入，不需要另外的彙總
+            return
+        label = f'[{incident.stream}] ' if incident.stream else ''
+        if resolution == 'recovered':
+            console(f'\n[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {label}串流已恢復，'
+                    f'{incident.error_type} ({incident.reason}) 共 {incident.count} 次')
+        error_logger.error(f'{label}錯誤事件結束 ({resolution}): {incident.error_type} '
+                           f'({incident.reason}) 共 {incident.count} 次，'
+                           f'{incident.first_seen:%H:%M:%S} - {incident.last_seen:%H:%M:%S}')
+        self.save(incident.summary(resolution))
+
+
+_default_aggregator = None
+
+
+def get_default_aggregator():
+    global _default_aggregator
+    if _default_aggregator is None:
+        from error_store import get_default_store
+        _default_aggregator = ErrorAggregator(get_default_store().append)
+        # 在 ErrorStore 關閉前寫出進行中事件的彙總 (atexit 依註冊的相反順序執行)
+        atexit.register(_default_aggregator.close)
+    return _default_aggregator
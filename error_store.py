@@ -0,0 +1,364 @@
+"""串流錯誤記錄存放區 (append-only JSONL)
+
+每筆錯誤記錄寫成一行 JSON，先放在記憶體緩衝區，達到筆數或時間門檻時才
+一次寫入並 fsync，因此寫入一筆錯誤的成本與累積的錯誤數量無關。檔案超過
+大小或時間上限時會輪替，舊檔保留為 stream_errors-YYYYmmdd-HHMMSS-ffffff.jsonl。
+監控程式使用的預設存放區再包一層 BackgroundWriter，編碼與寫檔都在背景
+執行緒進行。
+
+也可以直接執行本檔案來讀取、合併或匯出舊版 JSON 陣列格式:
+
+    python error_store.py tail -n 20
+    python error_store.py export logs/stream_errors.json
+    python error_store.py compact
+"""
+import argparse
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_PATH = 'logs/stream_errors.jsonl'
+
+
+class ErrorStore:
+    def __init__(self, path=DEFAULT_PATH, flush_every=50, flush_interval=1.0,
+                 max_bytes=50 * 1024 * 1024, rotate_interval=24 * 3600,
+                 fsync=True):
+        self.path = path
+        self.flush_every = flush_every          # 緩衝幾筆後寫入
+        self.flush_interval = flush_interval    # 最長多久寫入一次 (秒)
+        self.max_bytes = max_bytes              # 單一檔案大小上限
+        self.rotate_interval = rotate_interval  # 單一檔案時間上限 (秒)
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._last_flush = time.monotonic()
+        self.written = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+        if self._size:
+            # 沿用既有檔案時以檔案修改時間作為輪替起點
+            self._opened_at = os.path.getmtime(self.path)
+
+    def _should_rotate(self):
+        if not self._size:
+            return False
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        if self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval:
+            return True
+        return False
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        base, ext = os.path.splitext(self.path)
+        target = f'{base}-{stamp}{ext}'
+        suffix = 1
+        while os.path.exists(target):
+            target = f'{base}-{stamp}{suffix:02d}{ext}'
+            suffix += 1
+        os.replace(self.path, target)
+        self._open()
+
+    def append(self, record):
+        """加入一筆錯誤記錄，必要時觸發批次寫入"""
+        line = json.dumps(record, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+        with self._lock:
+            self._buffer.append(line)
+            if (len(self._buffer) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def maybe_flush(self):
+        """由監控迴圈定期呼叫，確保閒置時緩衝區也會在 flush_interval 內寫出"""
+        if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._open()
+        elif self._should_rotate():
+            self._rotate()
+        data = b''.join(self._buffer)
+        count = len(self._buffer)
+        self._buffer = []
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._size += len(data)
+        self.written += count
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_locked()
+            finally:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+
+
+class BackgroundWriter:
+    """在背景執行緒寫入 ErrorStore，呼叫端的 append 只把記錄放進有上限的佇列
+
+    JSON 編碼、寫檔與 fsync 都在背景執行緒進行；佇列滿時丟棄記錄並累加
+    dropped，不會讓監控迴圈等待磁碟。
+    """
+
+    def __init__(self, store, maxsize=10000):
+        self.store = store
+        self.capacity = maxsize
+        self.dropped = 0
+        self.max_depth = 0
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name='error-store-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def written(self):
+        return self.store.written
+
+    def append(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def maybe_flush(self):
+        """背景執行緒會自行依 flush_interval 寫出，這裡不需要做事"""
+
+    def flush(self, timeout=10):
+        """等待佇列中的記錄寫入檔案"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+        self.store.close()
+
+    def stats(self):
+        return {
+            'depth': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'dropped': self.dropped,
+            'capacity': self.capacity,
+        }
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.store.flush_interval)
+            except queue.Empty:
+                self.store.maybe_flush()
+                continue
+            try:
+                if item is None:
+                    return
+                if isinstance(item, threading.Event):
+                    self.store.flush()
+                    item.set()
+                else:
+                    self.store.append(item)
+                    self.store.maybe_flush()
+            except Exception as e:
+                logging.getLogger('error_logger').error(f'寫入錯誤記錄時發生錯誤: {str(e)}')
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def list_files(path=DEFAULT_PATH):
+    """依時間順序列出輪替後的舊檔與目前的檔案"""
+    base, ext = os.path.splitext(path)
+    rotated = sorted(glob.glob(f'{base}-*{ext}') + glob.glob(f'{base}-*{ext}.gz'))
+    if os.path.exists(path):
+        rotated.append(path)
+    return rotated
+
+
+def iter_errors(path=DEFAULT_PATH):
+    """逐筆讀出所有錯誤記錄，略過寫到一半被中斷的行"""
+    for file_path in list_files(path):
+        with _open_text(file_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def export_legacy_json(output, path=DEFAULT_PATH):
+    """匯出成舊版 save_error_details 使用的 JSON 陣列格式"""
+    tmp = output + '.tmp'
+    count = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for record in iter_errors(path):
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(record, ensure_ascii=False, indent=2))
+            count += 1
+        f.write('\n]\n' if count else ']\n')
+    os.replace(tmp, output)
+    return count
+
+
+def _read_imported(path):
+    try:
+        with open(path + '.imported', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def import_legacy_json(source, path=DEFAULT_PATH):
+    """把舊版 JSON 陣列檔案的內容轉入 JSONL 存放區
+
+    匯入過的內容 (以 SHA-256 判斷) 記在 <path>.imported，同一份檔案再次匯入時
+    不寫入任何記錄並回傳 None。
+    """
+    if not os.path.exists(source) or not os.path.getsize(source):
+        return 0
+    with open(source, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    imported = _read_imported(path)
+    if digest in imported:
+        return None
+    try:
+        records = json.loads(content.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return 0
+    store = ErrorStore(path, flush_every=len(records) + 1, flush_interval=float('inf'),
+                       max_bytes=0, rotate_interval=0)
+    for record in records:
+        store.append(record)
+    store.close()
+    imported[digest] = {'source': os.path.abspath(source), 'records': len(records),
+                        'imported_at': datetime.now().isoformat()}
+    tmp = path + '.imported.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(imported, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path + '.imported')
+    return len(records)
+
+
+def compact(path=DEFAULT_PATH):
+    """把已輪替的舊檔合併成單一 gzip 檔，目前寫入中的檔案不動"""
+    rotated = [p for p in list_files(path) if p != path]
+    if len(rotated) < 2 and not any(not p.endswith('.gz') for p in rotated):
+        return None
+    base, ext = os.path.splitext(path)
+    prefix = len(os.path.basename(base)) + 1
+    first = os.path.basename(rotated[0])[prefix:].split('.')[0].split('_')[0]
+    last = os.path.basename(rotated[-1])[prefix:].split('.')[0].split('_')[-1]
+    target = f'{base}-{first}_{last}{ext}.gz'
+    tmp = target + '.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as out:
+        for file_path in rotated:
+            with _open_text(file_path) as f:
+                for line in f:
+                    if line.strip():
+                        out.write(line if line.endswith('\n') else line + '\n')
+    # 先換上合併檔再刪除來源，中途中斷最多留下重複的記錄，不會只剩 .tmp
+    os.replace(tmp, target)
+    for file_path in rotated:
+        if file_path != target:
+            os.remove(file_path)
+    return target
+
+
+_default_store = None
+
+
+def get_default_store(log_dir=None):
+    """共用的錯誤記錄；log_dir 只在第一次呼叫 (建立時) 有效"""
+    global _default_store
+    if _default_store is None:
+        path = os.path.join(log_dir, os.path.basename(DEFAULT_PATH)) if log_dir else DEFAULT_PATH
+        _default_store = BackgroundWriter(ErrorStore(path))
+        atexit.register(_default_store.close)
+    return _default_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='串流錯誤記錄工具')
+    parser.add_argument('--path', default=DEFAULT_PATH, help='JSONL 錯誤記錄檔路徑')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    tail = sub.add_parser('tail', help='顯示最近的錯誤記錄')
+    tail.add_argument('-n', type=int, default=20)
+
+    export = sub.add_parser('export', help='匯出成舊版 JSON 陣列')
+    export.add_argument('output')
+
+    imp = sub.add_parser('import', help='匯入舊版 JSON 陣列')
+    imp.add_argument('source')
+
+    sub.add_parser('compact', help='合併並壓縮已輪替的檔案')
+
+    args = parser.parse_args(argv)
+    if args.command == 'tail':
+        from collections import deque
+        for record in deque(iter_errors(args.path), maxlen=args.n):
+            print(json.dumps(record, ensure_ascii=False))
+    elif args.command == 'export':
+        count = export_legacy_json(args.output, args.path)
+        print(f'已匯出 {count} 筆錯誤記錄到: {args.output}')
+    elif args.command == 'import':
+        count = import_legacy_json(args.source, args.path)
+        print(f'{args.source} 已經匯入過，略過' if count is None else f'已匯入 {count} 筆錯誤記錄')
+    elif args.command == 'compact':
+        target = compact(args.path)
+        print(f'已合併到: {target}' if target else '沒有需要合併的檔案')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""不開瀏覽器的 HLS 串流探測
+
+大部分串流只需要確認兩件事: /Media1/live/*.m3u8 播放清單有沒有持續更新，
+以及清單中的 .ts 片段能不能準時回應 2xx。這裡直接透過 HTTP 完成:
+
+1. 用與網頁相同的 APIPath/api/user/login 登入一次 (或沿用瀏覽器儲存在
+   session_cache 的登入狀態，先以一次播放清單請求確認仍有效)，之後共用
+   cookie / token；回應 401/403 時重新登入
+2. 依 #EXT-X-TARGETDURATION 定期重新抓取播放清單並解析
+3. 新出現的片段以連線池並行 HEAD (或 GET) 檢查
+
+結果以與 performance log 相同格式的 Network 事件交給 event_handler，
+因此會產生與瀏覽器模式相同的 STREAM_ERROR / STREAM_LOADING_FAILED 記錄。
+"""
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+error_logger = logging.getLogger('error_logger')
+
+LOGIN_PATH = '/APIPath/api/user/login'
+
+
+def _find_token(data):
+    """從登入回應中找出 token (欄位名稱依後端版本可能不同)"""
+    if not isinstance(data, dict):
+        return None
+    for key in ('token', 'accessToken', 'access_token', 'jwt'):
+        if isinstance(data.get(key), str):
+            return data[key]
+    for key in ('data', 'result'):
+        token = _find_token(data.get(key))
+        if token:
+            return token
+    return None
+
+
+def api_login(session, base_url, username, password, login_path=LOGIN_PATH, timeout=10):
+    """直接呼叫登入 API，成功後 session 會帶著 cookie 與 Authorization 標頭"""
+    response = session.post(
+        f'{base_url}{login_path}',
+        json={'account': username, 'password': password},
+        timeout=timeout,
+    )
+    if response.status_code != 200:
+        raise Exception(f'登入API回應狀態碼: {response.status_code}')
+    try:
+        token = _find_token(response.json())
+    except ValueError:
+        token = None
+    if token:
+        session.headers['Authorization'] = f'Bearer {token}'
+    return token
+
+
+def apply_cached_session(session, cached):
+    """把瀏覽器儲存的 cookies 與 token 套用到 requests.Session，回傳 token"""
+    from session_cache import find_token
+
+    for cookie in cached.get('cookies') or []:
+        session.cookies.set(cookie['name'], cookie['value'],
+                            domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    token = find_token(cached)
+    if token:
+        session.headers['Authorization'] = f'Bearer {token}'
+    return token
+
+
+def create_session(pool_size=32):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_playlist(text, playlist_url):
+    """解析 m3u8，回傳 master 清單的 variants 或 media 清單的片段"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != '#EXTM3U':
+        raise ValueError('不是有效的 m3u8 播放清單')
+
+    playlist = {
+        'variants': [],
+        'segments': [],
+        'target_duration': None,
+        'media_sequence': 0,
+        'endlist': False,
+    }
+    duration = None
+    bandwidth = 0
+    expect_variant = False
+    for line in lines[1:]:
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            expect_variant = True
+            for attr in line.split(':', 1)[1].split(','):
+                if attr.startswith('BANDWIDTH='):
+                    bandwidth = int(attr.split('=', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            playlist['target_duration'] = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            playlist['media_sequence'] = int(line.split(':', 1)[1])
+        elif line.startswith('#EXTINF:'):
+            duration = float(line.split(':', 1)[1].split(',')[0])
+        elif line.startswith('#EXT-X-ENDLIST'):
+            playlist['endlist'] = True
+        elif line.startswith('#'):
+            continue
+        elif expect_variant:
+            playlist['variants'].append((bandwidth, urljoin(playlist_url, line)))
+            expect_variant = False
+            bandwidth = 0
+        else:
+            sequence = playlist['media_sequence'] + len(playlist['segments'])
+            playlist['segments'].append((sequence, urljoin(playlist_url, line), duration))
+            duration = None
+    return playlist
+
+
+def _response_params(response, request_id, started):
+    # 以與 CDP 相同的欄位提供時間資訊 (requestTime 為秒，其餘為相對毫秒)
+    return {
+        'requestId': request_id,
+        'timestamp': time.monotonic(),
+        'response': {
+            'url': response.url,
+            'status': response.status_code,
+            'headers': dict(response.headers),
+            'mimeType': response.headers.get('content-type', ''),
+            'timing': {
+                'requestTime': started,
+                'sendStart': 0.0,
+                'receiveHeadersEnd': response.elapsed.total_seconds() * 1000,
+            },
+        },
+    }
+
+
+class PlaylistProbe:
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.media_url = None       # master 清單展開後實際追蹤的 media 清單
+        self.last_sequence = None
+        self.last_change = time.monotonic()
+        self.interval = 2.0
+        self.next_poll = 0.0
+        self.busy = False
+        self.stalled = False
+
+
+class HLSProbe:
+    """以單一排程執行緒加上 HTTP 連線池，同時探測大量播放清單"""
+
+    def __init__(self, event_handler, save_error, session=None, workers=32,
+                 segment_method='HEAD', stall_factor=3, min_interval=1.0, session_cache=None):
+        self.event_handler = event_handler
+        self.save_error = save_error
+        self.session = session or create_session(workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hls-probe')
+        self.segment_method = segment_method
+        self.stall_factor = stall_factor    # 播放清單幾個 target duration 沒更新視為停滯
+        self.min_interval = min_interval
+        self.probes = []
+        self.stop_event = threading.Event()
+        self.session_cache = session_cache  # session_cache.CacheEntry，沿用瀏覽器儲存的登入狀態
+        self._request_ids = itertools.count(1)
+        self._thread = None
+        self._credentials = None
+        self._login_lock = threading.Lock()
+        self._logged_in_at = 0.0
+
+    def login(self, base_url, username, password, check_url=None):
+        """快取的登入狀態能通過 check_url 的請求時直接沿用，否則呼叫登入 API"""
+        self._credentials = (base_url, username, password)
+        cached = self.session_cache.load() if self.session_cache is not None else None
+        if cached is not None and check_url is not None:
+            token = apply_cached_session(self.session, cached)
+            if self._authorized(check_url):
+                return token
+            # 快取已失效，清掉套用的 cookie / token 後重新登入
+            self.session_cache.invalidate()
+            self.session.cookies.clear()
+            self.session.headers.pop('Authorization', None)
+        self._logged_in_at = time.monotonic()
+        return api_login(self.session, base_url, username, password)
+
+    def _authorized(self, url):
+        try:
+            response = self.session.get(url, timeout=10)
+        except requests.RequestException as e:
+            error_logger.error(f'探測模式無法確認登入狀態: {str(e)}')
+            return False
+        return response.status_code not in (401, 403)
+
+    def _relogin(self):
+        """回應 401/403 時重新登入；短時間內只重試一次，避免每個請求都登入"""
+        if self._credentials is None:
+            return False
+        with self._login_lock:
+            if time.monotonic() - self._logged_in_at < 30:
+                return True
+            self._logged_in_at = time.monotonic()
+            try:
+                api_login(self.session, *self._credentials)
+            except Exception as e:
+                error_logger.error(f'探測模式重新登入失敗: {str(e)}')
+                return False
+        return True
+
+    def add(self, name, url):
+        self.probes.append(PlaylistProbe(name, url))
+
+    def remove(self, name):
+        # 換成新的 list，排程執行緒下一輪就不會再探測
+        self.probes = [probe for probe in self.probes if probe.name != name]
+
+    def update(self, playlists):
+        """playlists 為 {名稱: 網址}，只新增或移除有變動的播放清單"""
+        current = {probe.name: probe.url for probe in self.probes}
+        for name, url in current.items():
+            if playlists.get(name) != url:
+                self.remove(name)
+        for name, url in playlists.items():
+            if current.get(name) != url:
+                self.add(name, url)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='hls-probe-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for probe in self.probes:
+                if not probe.busy and now >= probe.next_poll:
+                    probe.busy = True
+                    self.executor.submit(self._poll, probe)
+            self.stop_event.wait(0.05)
+
+    def _emit(self, method, params, probe):
+        try:
+            self.event_handler(method, params, stream=probe.name)
+        except Exception as e:
+            error_logger.error(f'[{probe.name}] 處理探測結果時發生錯誤: {str(e)}')
+
+    def _fetch(self, url, probe, method='GET', timeout=10):
+        """抓取單一網址，失敗時送出對應的 Network 事件並回傳 None"""
+        request_id = f'probe.{next(self._request_ids)}'
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, url, timeout=timeout)
+            if response.status_code in (401, 403) and self._relogin():
+                response = self.session.request(method, url, timeout=timeout)
+        except requests.RequestException as e:
+            self._emit('Network.loadingFailed', {
+                'requestId': request_id,
+                'url': url,
+                'errorText': f'{e.__class__.__name__}: {str(e)}',
+            }, probe)
+            return None
+        self._emit('Network.responseReceived', _response_params(response, request_id, started), probe)
+        if method != 'HEAD':
+            self._emit('Network.loadingFinished', {
+                'requestId': request_id,
+                'timestamp': time.monotonic(),
+                'encodedDataLength': len(response.content),
+            }, probe)
+        if response.status_code >= 400:
+            return None
+        return response
+
+    def _poll(self, probe):
+        try:
+            self._poll_playlist(probe)
+        except Exception as e:
+            # stop() 關閉 executor 後仍在進行的探測無法再送出片段請求，不是錯誤
+            if not self.stop_event.is_set():
+                error_logger.error(f'[{probe.name}] 探測播放清單時發生錯誤: {str(e)}')
+        finally:
+            probe.next_poll = time.monotonic() + probe.interval
+            probe.busy = False
+
+    def _poll_playlist(self, probe):
+        url = probe.media_url or probe.url
+        response = self._fetch(url, probe)
+        if response is None:
+            return
+        playlist = parse_playlist(response.text, response.url)
+
+        if playlist['variants']:
+            # master 清單: 改為追蹤頻寬最高的 media 清單
+            probe.media_url = max(playlist['variants'])[1]
+            probe.next_poll = 0.0
+            return
+
+        if playlist['target_duration']:
+            probe.interval = max(self.min_interval, playlist['target_duration'] / 2)
+
+        now = time.monotonic()
+        new_segments = [s for s in playlist['segments']
+                        if probe.last_sequence is None or s[0] > probe.last_sequence]
+        if new_segments:
+            probe.last_sequence = new_segments[-1][0]
+            probe.last_change = now
+            probe.stalled = False
+            timeout = playlist['target_duration'] or 10
+            for _, segment_url, _ in new_segments:
+                if self.stop_event.is_set():
+                    return
+                self.executor.submit(self._fetch, segment_url, probe, self.segment_method, timeout)
+        elif not playlist['endlist'] and not probe.stalled:
+            idle = now - probe.last_change
+            if idle >= self.stall_factor * (playlist['target_duration'] or probe.interval):
+                probe.stalled = True
+                error_logger.error(f'[{probe.name}] 播放清單 {idle:.0f} 秒沒有更新')
+                self.save_error({
+                    'timestamp': datetime.now().isoformat(),
+                    'stream': probe.name,
+                    'url': url,
+                    'error_type': 'STREAM_STALLED',
+                    'idle_seconds': round(idle, 1),
+                    'media_sequence': probe.last_sequence,
+                })
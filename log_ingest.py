@@ -0,0 +1,133 @@
+"""performance log 快速過濾與解碼
+
+ChromeDriver 的 performance log 每筆都是一整段 JSON 字串，其中包含大量
+標頭與 initiator stack。忙碌的頁面上 (廣告、分析、播放器輪詢) 絕大多數
+事件最後都會被丟棄，先 json.loads 再判斷會把大部分 CPU 花在解碼不需要
+的事件上。
+
+這裡在解碼前先以字串搜尋過濾原始訊息:
+
+- 只看 method 欄位，不是需要的 Network 事件直接丟棄
+- requestWillBeSent / responseReceived 必須包含網址過濾字串
+- loadingFinished / loadingFailed 沒有網址，只保留先前記下的 requestId
+
+通過過濾的事件才做完整解碼；loadingFailed 會補上對應的 'url' 欄位，
+與 CDP 訂閱模式送出的格式一致。ChromeDriver 輸出的 JSON 沒有多餘空白且
+method 位於 params 之前，若格式不符則退回完整解碼，不會漏掉事件。
+"""
+import json
+import weakref
+
+MEDIA_URL_FILTER = '/Media1/live/'
+
+REQUEST = 'Network.requestWillBeSent'
+RESPONSE = 'Network.responseReceived'
+FINISHED = 'Network.loadingFinished'
+FAILED = 'Network.loadingFailed'
+
+_METHOD_KEY = '"method":"'
+_REQUEST_ID_KEY = '"requestId":"'
+
+
+def _between(raw, key):
+    start = raw.find(key)
+    if start < 0:
+        return None
+    start += len(key)
+    end = raw.find('"', start)
+    if end < 0:
+        return None
+    return raw[start:end]
+
+
+class LogIngestor:
+    """一個 LogIngestor 對應一個瀏覽器，保存追蹤中的 requestId"""
+
+    def __init__(self, url_filters=(MEDIA_URL_FILTER,), methods=(REQUEST, RESPONSE, FINISHED, FAILED),
+                 max_tracked=10000):
+        self.url_filters = tuple(url_filters)
+        self.methods = frozenset(methods)
+        self.max_tracked = max_tracked
+        self.tracked = {}     # requestId -> url
+        self.seen = 0
+        self.decoded = 0
+
+    def _match_url(self, text):
+        for url_filter in self.url_filters:
+            if url_filter in text:
+                return True
+        return False
+
+    def _track(self, request_id, url):
+        if len(self.tracked) >= self.max_tracked:
+            self.tracked.pop(next(iter(self.tracked)))
+        self.tracked[request_id] = url
+
+    def _prefilter(self, raw):
+        """不解碼 JSON，判斷這筆訊息是否可能需要處理"""
+        method = _between(raw, _METHOD_KEY)
+        if method is None:
+            return True
+        if method not in self.methods:
+            return False
+        if method in (REQUEST, RESPONSE):
+            return self._match_url(raw)
+        request_id = _between(raw, _REQUEST_ID_KEY)
+        return request_id is None or request_id in self.tracked
+
+    def ingest(self, entries):
+        """過濾並解碼 get_log('performance') 的結果
+
+        回傳 [(webview, method, params), ...]，只包含需要處理的事件。
+        """
+        events = []
+        for entry in entries:
+            self.seen += 1
+            raw = entry['message']
+            if not self._prefilter(raw):
+                continue
+            try:
+                message = json.loads(raw)
+                log = message['message']
+                method = log['method']
+                params = log['params']
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.decoded += 1
+            if method not in self.methods:
+                continue
+
+            if method == REQUEST:
+                url = params.get('request', {}).get('url', '')
+                if self._match_url(url):
+                    self._track(params.get('requestId'), url)
+                continue
+            if method == RESPONSE:
+                url = params.get('response', {}).get('url', '')
+                if not self._match_url(url):
+                    continue
+                request_id = params.get('requestId')
+                if request_id not in self.tracked:
+                    self._track(request_id, url)
+            else:
+                url = self.tracked.pop(params.get('requestId'), None)
+                if url is None:
+                    continue
+                if method == FAILED:
+                    params.setdefault('url', url)
+            events.append((message.get('webview'), method, params))
+        return events
+
+    def read(self, driver):
+        return self.ingest(driver.get_log('performance'))
+
+
+_ingestors = weakref.WeakKeyDictionary()
+
+
+def ingestor_for(driver):
+    """取得 (或建立) 某個瀏覽器專用的媒體事件 LogIngestor"""
+    ingestor = _ingestors.get(driver)
+    if ingestor is None:
+        ingestor = _ingestors[driver] = LogIngestor()
+    return ingestor
@@ -0,0 +1,143 @@
+"""監控設定檔 (JSON) 與環境變數
+
+以設定檔描述要監控的網站、帳號與串流，取代執行時的 Tk 對話框與寫死的
+帳號密碼:
+
+    {
+        "metrics_port": 9108,
+        "reload_interval": 5,
+        "sites": [
+            {
+                "name": "lab",
+                "base_url": "http://192.168.31.101",
+                "username": "admin",
+                "password_env": "LAB_PASSWORD",
+                "streams": ["14", "15", "http://192.168.31.101/Media1/live/cam3/index.m3u8"],
+                "profile": "monitor",
+                "recycle_hours": 6
+            }
+        ]
+    }
+
+streams 可以是 case id、串流頁面網址或 .m3u8 網址 (改用不開瀏覽器的探測)。
+密碼必須直接寫在 password，或用 password_env 指定環境變數名稱，沒有設定時
+視為設定錯誤。
+
+沒有設定檔時，可以只用環境變數描述單一網站:
+MONITOR_BASE_URL、MONITOR_USERNAME、MONITOR_PASSWORD (必要)、MONITOR_STREAMS
+(逗號分隔)。設定檔路徑也可以由 MONITOR_CONFIG 指定。
+
+日誌、錯誤記錄 (stream_errors.jsonl) 與登入快取都寫在 log_dir；metrics_file
+未指定時也放在 log_dir。
+"""
+import json
+import os
+
+DEFAULT_TARGET = '/case-live/14'
+DEFAULT_USERNAME = 'admin'
+
+SITE_DEFAULTS = {
+    'username': DEFAULT_USERNAME,
+    'target': DEFAULT_TARGET,      # 沒有指定 streams 時監控的頁面
+    'streams': [],
+    'profile': 'monitor',
+    'recycle_hours': None,
+    'max_drivers': 4,
+    'streams_per_driver': 8,
+}
+
+DEFAULTS = {
+    'metrics_port': 9108,
+    'log_dir': 'logs',
+    'reload_interval': 5,          # 檢查設定檔是否變更的間隔秒數
+}
+
+
+class ConfigError(Exception):
+    pass
+
+
+def _site(raw, index, env):
+    if not isinstance(raw, dict):
+        raise ConfigError(f'sites[{index}] 必須是物件')
+    site = dict(SITE_DEFAULTS)
+    site.update(raw)
+    base_url = site.get('base_url')
+    if not base_url:
+        raise ConfigError(f'sites[{index}] 缺少 base_url')
+    if not base_url.startswith(('http://', 'https://')):
+        base_url = 'http://' + base_url
+    site['base_url'] = base_url.rstrip('/')
+    site.setdefault('name', site['base_url'].split('://', 1)[1])
+    if site.get('password_env'):
+        site['password'] = env.get(site['password_env'])
+        if site['password'] is None:
+            raise ConfigError(f'{site["name"]}: 環境變數 {site["password_env"]} 未設定')
+    if site.get('password') is None:
+        raise ConfigError(f'{site["name"]}: 缺少 password 或 password_env')
+    if isinstance(site['streams'], str):
+        site['streams'] = [s for s in site['streams'].split(',') if s.strip()]
+    site['streams'] = [str(s).strip() for s in site['streams']]
+    return site
+
+
+def parse_config(data, env=None):
+    """補上預設值並檢查設定內容，回傳新的 dict"""
+    env = os.environ if env is None else env
+    if not isinstance(data, dict):
+        raise ConfigError('設定檔必須是 JSON 物件')
+    config = dict(DEFAULTS)
+    config.update(data)
+    config.setdefault('metrics_file', os.path.join(config['log_dir'], 'stream_metrics.json'))
+    sites = [_site(raw, index, env) for index, raw in enumerate(config.get('sites') or [])]
+    if not sites:
+        raise ConfigError('設定檔沒有任何網站 (sites)')
+    names = [site['name'] for site in sites]
+    if len(set(names)) != len(names):
+        raise ConfigError('網站名稱 (name) 不可重複')
+    config['sites'] = sites
+    return config
+
+
+def config_from_env(env=None):
+    """只用環境變數描述單一網站，沒有設定 MONITOR_BASE_URL 時回傳 None"""
+    env = os.environ if env is None else env
+    if not env.get('MONITOR_BASE_URL'):
+        return None
+    if not env.get('MONITOR_PASSWORD'):
+        raise ConfigError('已設定 MONITOR_BASE_URL，但沒有設定 MONITOR_PASSWORD')
+    site = {'base_url': env['MONITOR_BASE_URL']}
+    for key in ('username', 'password', 'streams', 'profile'):
+        value = env.get(f'MONITOR_{key.upper()}')
+        if value:
+            site[key] = value
+    return parse_config({'sites': [site]}, env)
+
+
+def load_config(path=None, env=None):
+    """讀取設定檔；path 未指定時依序使用 MONITOR_CONFIG 與 MONITOR_* 環境變數"""
+    env = os.environ if env is None else env
+    path = path or env.get('MONITOR_CONFIG')
+    if not path:
+        config = config_from_env(env)
+        if config is None:
+            raise ConfigError('未指定設定檔，也沒有設定 MONITOR_BASE_URL')
+        return config
+    with open(path, encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f'{path}: {str(e)}')
+    return parse_config(data, env)
+
+
+def split_streams(streams):
+    """分成 (瀏覽器串流, .m3u8 播放清單)"""
+    playlists = [s for s in streams if '.m3u8' in s]
+    pages = [s for s in streams if '.m3u8' not in s]
+    return pages, playlists
+
+
+def playlist_name(url):
+    """以 /Media1/live/ 之後的路徑作為播放清單名稱，例如 cam3/index.m3u8"""
+    return url.split('/Media1/live/', 1)[-1]
@@ -0,0 +1,221 @@
+"""無介面的常駐監控模式
+
+依設定檔 (見 monitor_config.py) 同時監控多個網站，不使用 Tk 對話框，適合
+以 systemd 等服務管理程式執行:
+
+    python monitor_daemon.py --config monitor.json
+    MONITOR_BASE_URL=http://192.168.31.101 MONITOR_STREAMS=14,15 python monitor_daemon.py
+
+設定檔變更 (或收到 SIGHUP) 時重新載入:
+
+- 只有串流清單變動的網站，直接開關對應的分頁 / 探測，不重新啟動瀏覽器
+- 網址、帳號或瀏覽器設定變動的網站才會整個重新啟動
+- 新增或移除的網站分別啟動或停止
+
+SIGTERM / SIGINT 會寫出錯誤記錄後結束。
+"""
+import argparse
+import os
+import signal
+import threading
+import time
+
+import async_logging
+from async_logging import console
+from error_store import get_default_store
+from monitor_config import ConfigError, load_config, playlist_name, split_streams
+from session_cache import get_session_cache
+from stream_metrics import get_metrics
+from website_monitor import (error_logger, flush_errors, handle_network_event, login,
+                             maybe_flush_errors, save_error_details, setup_driver, setup_logging)
+
+
+def _restart_keys(site):
+    # 這些欄位變動時必須重新啟動整個網站的監控
+    return {key: value for key, value in site.items() if key != 'streams'}
+
+
+class SiteMonitor:
+    """一個網站的瀏覽器串流 (StreamPool) 與播放清單探測 (HLSProbe)"""
+
+    def __init__(self, site):
+        self.site = site
+        self.pool = None
+        self.probe = None
+        self.probe_logged_in = False
+
+    @property
+    def name(self):
+        return self.site['name']
+
+    def _pages(self, streams):
+        pages, playlists = split_streams(streams)
+        if not pages and not playlists:
+            # 沒有指定串流時監控預設頁面
+            pages = [f'{self.site["base_url"]}{self.site["target"]}']
+        return pages, {playlist_name(url): url for url in playlists}
+
+    def start(self):
+        from hls_probe import HLSProbe
+        from stream_pool import StreamPool
+
+        site = self.site
+        recycle_hours = site.get('recycle_hours')
+        cache = get_session_cache().entry(site['base_url'], site['username'])
+        self.pool = StreamPool(
+            site['base_url'],
+            driver_factory=lambda: setup_driver(site['profile']),
+            login_func=lambda driver: login(driver, f'{site["base_url"]}/login',
+                                            site['username'], site['password']),
+            event_handler=handle_network_event,
+            save_error=save_error_details,
+            max_drivers=site['max_drivers'],
+            streams_per_driver=site['streams_per_driver'],
+            recycle_interval=recycle_hours * 3600 if recycle_hours else None,
+            session_cache=cache,
+        )
+        self.probe = HLSProbe(handle_network_event, save_error_details, session_cache=cache)
+        pages, playlists = self._pages(site['streams'])
+        self.pool.start(pages)
+        self._update_probe(playlists)
+        self.probe.start()
+        console(f'[{self.name}] 開始監控 {site["base_url"]}: '
+                f'{len(pages)} 個串流頁面、{len(playlists)} 個播放清單')
+
+    def _update_probe(self, playlists):
+        if playlists and not self.probe_logged_in:
+            try:
+                self.probe.login(self.site['base_url'], self.site['username'], self.site['password'],
+                                 check_url=next(iter(playlists.values())))
+                self.probe_logged_in = True
+            except Exception as e:
+                # 播放清單不一定需要登入，失敗時仍繼續探測
+                error_logger.error(f'[{self.name}] 探測模式登入失敗: {str(e)}')
+        self.probe.update(playlists)
+
+    def update(self, site):
+        """套用新的設定，回傳 False 表示需要重新啟動"""
+        if _restart_keys(site) != _restart_keys(self.site):
+            return False
+        if site['streams'] != self.site['streams']:
+            pages, playlists = self._pages(site['streams'])
+            self.pool.update(pages)
+            self._update_probe(playlists)
+            console(f'[{self.name}] 已更新串流清單: {len(pages)} 個串流頁面、{len(playlists)} 個播放清單')
+        self.site = site
+        return True
+
+    def stop(self):
+        if self.probe is not None:
+            self.probe.stop()
+        if self.pool is not None:
+            self.pool.stop()
+
+
+class Daemon:
+    def __init__(self, config_path=None):
+        self.config_path = config_path or os.environ.get('MONITOR_CONFIG')
+        self.config = load_config(self.config_path)
+        self.monitors = {}
+        self.stop_event = threading.Event()
+        self.reload_event = threading.Event()
+        self._mtime = self._config_mtime()
+
+    def _config_mtime(self):
+        if not self.config_path:
+            return None
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+
+    def apply(self, config):
+        sites = {site['name']: site for site in config['sites']}
+        for name in list(self.monitors):
+            if name not in sites:
+                console(f'[{name}] 已從設定檔移除，停止監控')
+                self.monitors.pop(name).stop()
+        for name, site in sites.items():
+            monitor = self.monitors.get(name)
+            if monitor is not None and monitor.update(site):
+                continue
+            if monitor is not None:
+                console(f'[{name}] 設定已變更，重新啟動')
+                monitor.stop()
+            monitor = self.monitors[name] = SiteMonitor(site)
+            monitor.start()
+        self.config = config
+
+    def reload(self):
+        self._mtime = self._config_mtime()
+        try:
+            config = load_config(self.config_path)
+        except (ConfigError, OSError) as e:
+            # 設定檔有誤時沿用目前的設定
+            error_logger.error(f'重新載入設定檔失敗: {str(e)}')
+            console(f'重新載入設定檔失敗: {str(e)}')
+            return
+        self.apply(config)
+
+    def run(self):
+        self.apply(self.config)
+        next_check = time.monotonic() + self.config['reload_interval']
+        try:
+            while not self.stop_event.is_set():
+                maybe_flush_errors()
+                if time.monotonic() >= next_check:
+                    next_check = time.monotonic() + self.config['reload_interval']
+                    if self._config_mtime() != self._mtime:
+                        self.reload_event.set()
+                if self.reload_event.is_set():
+                    self.reload_event.clear()
+                    self.reload()
+                self.stop_event.wait(0.5)
+        finally:
+            for monitor in self.monitors.values():
+                monitor.stop()
+            flush_errors()
+
+
+def run_daemon(config_path=None):
+    try:
+        daemon = Daemon(config_path)
+    except (ConfigError, OSError) as e:
+        raise SystemExit(f'設定檔錯誤: {str(e)}')
+    config = daemon.config
+
+    # 日誌、錯誤記錄與登入快取都寫在 log_dir，必須在其他模組取用前建立
+    setup_logging(config['log_dir'])
+    get_session_cache(config['log_dir'])
+    store = get_default_store(config['log_dir'])
+    async_logging.start()
+    metrics = get_metrics()
+    for name, stats in async_logging.stats_sources().items():
+        metrics.add_queue(name, stats)
+    metrics.add_queue('error_store', store.stats)
+    if config['metrics_port']:
+        try:
+            metrics.serve(port=config['metrics_port'])
+        except OSError as e:
+            error_logger.error(f'無法啟動統計端點: {str(e)}')
+    if config['metrics_file']:
+        metrics.report_every(config['metrics_file'], interval=30)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop_event.set())
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: daemon.reload_event.set())
+
+    daemon.run()
+    console('監測程式已停止')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='串流網站監控 (常駐模式)')
+    parser.add_argument('--config', help='設定檔路徑，未指定時使用 MONITOR_CONFIG 或 MONITOR_* 環境變數')
+    args = parser.parse_args(argv)
+    run_daemon(args.config)
+
+
+if __name__ == '__main__':
+    main()
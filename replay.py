@@ -0,0 +1,212 @@
+"""錄製與重播 performance log / CDP 事件
+
+錄製: CapturingDriver 包住真正的 WebDriver，每次 get_log('performance')
+取得的記錄都會原樣寫入 gzip 壓縮的 JSONL；CDP 訂閱模式收到的事件也會
+一併寫入。每行格式:
+
+    {"t": 12.345, "level": ..., "message": "...", "timestamp": ...}   performance log
+    {"t": 12.345, "method": "Network.responseReceived", "params": {...}}   CDP 事件
+
+t 為相對於開始錄製的秒數。
+
+重播: ReplayDriver 提供監控程式用到的 WebDriver 介面，依照 t 與 speed
+把錄製的記錄交還給 get_log('performance')，因此 process_browser_logs、
+login 的登入偵測與 save_error_details 都能在沒有網站與 Chrome 的環境下
+執行。CDP 事件會轉成 performance log 格式，走同一條處理路徑。
+"""
+import gzip
+import json
+import threading
+import time
+import weakref
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.count = 0
+
+    def _write(self, record):
+        record['t'] = round(time.monotonic() - self._started, 6)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self.count += 1
+
+    def write_entries(self, entries):
+        for entry in entries:
+            self._write(dict(entry))
+
+    def write_event(self, method, params):
+        self._write({'method': method, 'params': params})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class CapturingDriver:
+    """把 get_log('performance') 的結果寫入錄製檔，其餘操作原樣轉給 WebDriver"""
+
+    def __init__(self, driver, writer):
+        self._driver = driver
+        self.writer = writer
+
+    def get_log(self, log_type):
+        entries = self._driver.get_log(log_type)
+        if log_type == 'performance' and entries:
+            self.writer.write_entries(entries)
+        return entries
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+def read_capture(path):
+    """逐筆讀出錄製檔的記錄，略過損壞的行"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def to_log_entry(record):
+    """把錄製記錄轉成 get_log('performance') 的格式"""
+    if 'message' in record:
+        return {
+            'level': record.get('level', 'INFO'),
+            'message': record['message'],
+            'timestamp': record.get('timestamp', 0),
+        }
+    message = {'message': {'method': record['method'], 'params': record['params']},
+               'webview': record.get('webview', 'replay')}
+    return {
+        'level': 'INFO',
+        'message': json.dumps(message, separators=(',', ':')),
+        'timestamp': 0,
+    }
+
+
+def to_log_entries(record):
+    """把一筆錄製記錄轉成一或多筆 performance log 記錄
+
+    cdp_listener 不轉交 requestWillBeSent，因此 CDP 模式錄到的 loadingFailed
+    前面沒有對應的請求；先補一筆 requestWillBeSent，LogIngestor 才會接受它。
+    """
+    if 'message' not in record and record.get('method') == 'Network.loadingFailed':
+        params = record.get('params') or {}
+        if params.get('url'):
+            yield to_log_entry({
+                'method': 'Network.requestWillBeSent',
+                'params': {'requestId': params.get('requestId'), 'request': {'url': params['url']}},
+                'webview': record.get('webview', 'replay'),
+            })
+    yield to_log_entry(record)
+
+
+class _ReplayElement:
+    def send_keys(self, *args):
+        pass
+
+    def click(self):
+        pass
+
+
+class _ReplaySwitchTo:
+    def __init__(self, driver):
+        # 以 weakref 避免與 ReplayDriver 形成循環參照，重播結束後錄製記錄可立即釋放
+        self._driver = weakref.proxy(driver)
+
+    def window(self, handle):
+        self._driver.current_window_handle = handle
+
+    def new_window(self, kind='tab'):
+        handle = f'replay-{len(self._driver.window_handles)}'
+        self._driver.window_handles.append(handle)
+        self._driver.current_window_handle = handle
+
+
+def _login_succeeded(message):
+    return 'APIPath/api/user/login' in message and '"status":200' in message.replace(' ', '')
+
+
+class ReplayDriver:
+    """以錄製檔取代 Chrome 的 WebDriver 替身
+
+    speed=1 依原本的時間間隔重播，speed=10 為十倍速，speed=0 則不等待，
+    每次 get_log 直接回傳下一批 (最多 batch_size 筆) 記錄。登入 API 成功的
+    回應一定是一批的最後一筆，login() 不會讀走之後的串流事件。
+    """
+
+    def __init__(self, path=None, speed=1.0, batch_size=1000, records=None):
+        self.records = list(records if records is not None else read_capture(path))
+        self.speed = speed
+        self.batch_size = batch_size
+        self.position = 0
+        self.current_url = 'about:blank'
+        self.window_handles = ['replay']
+        self.current_window_handle = 'replay'
+        self.switch_to = _ReplaySwitchTo(self)
+        self._started = None
+
+    @property
+    def finished(self):
+        return self.position >= len(self.records)
+
+    def get_log(self, log_type):
+        if log_type != 'performance':
+            return []
+        if self._started is None:
+            self._started = time.monotonic()
+        end = self.position
+        if self.speed:
+            now = (time.monotonic() - self._started) * self.speed
+            while end < len(self.records) and self.records[end].get('t', 0) <= now:
+                end += 1
+        else:
+            end = min(len(self.records), self.position + self.batch_size)
+        batch = []
+        while self.position < end:
+            entries = list(to_log_entries(self.records[self.position]))
+            self.position += 1
+            batch += entries
+            if any(_login_succeeded(entry['message']) for entry in entries):
+                # 模擬登入成功後網頁跳轉到 library-list，讓 login() 可以完成；
+                # 這一批在登入回應後結束，之後的記錄留給 process_browser_logs
+                origin = self.current_url.split('/login')[0]
+                self.current_url = f'{origin}/library-list'
+                break
+        return batch
+
+    def get(self, url):
+        self.current_url = url
+
+    def find_element(self, by=None, value=None):
+        return _ReplayElement()
+
+    def get_cookies(self):
+        return []
+
+    def add_cookie(self, cookie):
+        pass
+
+    def execute_script(self, script, *args):
+        return {}
+
+    def refresh(self):
+        pass
+
+    def maximize_window(self):
+        pass
+
+    def quit(self):
+        pass
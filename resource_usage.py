@@ -0,0 +1,76 @@
+"""瀏覽器實例的記憶體用量 (RSS)
+
+WebDriver 只知道 chromedriver 的 pid，Chrome 本身 (browser、renderer、GPU
+等程序) 都是它的子孫程序，因此加總整棵程序樹的 RSS 才是一個實例的實際
+用量。有安裝 psutil 時使用 psutil，否則在 Linux 上直接讀取 /proc。
+"""
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _proc_children(pid):
+    children = []
+    task_dir = f'/proc/{pid}/task'
+    try:
+        tasks = os.listdir(task_dir)
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f'{task_dir}/{tid}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def _proc_rss(pid):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def process_tree_rss(pid):
+    """回傳 pid 及其所有子孫程序的 RSS 總和 (bytes)，無法取得時回傳 None"""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    if not os.path.exists('/proc'):
+        return None
+    total = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        total += _proc_rss(current)
+        pending.extend(_proc_children(current))
+    return total or None
+
+
+def driver_rss(driver):
+    """回傳 WebDriver 對應的 chromedriver + Chrome 程序樹 RSS (bytes)"""
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    return process_tree_rss(pid)
@@ -0,0 +1,153 @@
+"""登入狀態快取
+
+完整的登入流程 (開啟登入頁、等待表單、輸入帳密、等待登入 API) 每次要花
+好幾秒。這裡在登入成功後把 cookies 與 localStorage 存到檔案，瀏覽器重新
+啟動或程式重啟時直接套用，只有在 session 失效時才重新走登入流程。
+
+判斷是否失效分兩步，都不需要額外開啟登入頁:
+
+1. localStorage 或 cookie 中的 token 若是 JWT，直接讀取 exp 判斷是否過期
+2. 沒有 exp 時以 max_age 為上限
+
+token 仍可能已被伺服器撤銷，因此套用後還要確認: 瀏覽器等到出現播放器或
+登入表單，出現登入表單才視為失效並刪除 (stream_pool.page_state)。HLS 探測模式
+(hls_probe) 套用同一份快取中的 cookies 與 token 後，先請求一次播放清單，
+回應 401/403 時同樣刪除並改用登入 API。
+"""
+import base64
+import json
+import os
+import threading
+import time
+
+DEFAULT_PATH = 'logs/session_cache.json'
+
+
+def _jwt_payload(token):
+    parts = token.split('.')
+    if len(parts) != 3:
+        return None
+    payload = parts[1] + '=' * (-len(parts[1]) % 4)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(payload))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def find_token(session):
+    """從 localStorage / cookies 中找出看起來像 JWT 的 token"""
+    values = list((session.get('local_storage') or {}).values())
+    values += [cookie.get('value', '') for cookie in session.get('cookies') or []]
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        candidates = [value.strip('"')]
+        if value.startswith('{'):
+            # Angular 常把整個登入結果以 JSON 字串存進 localStorage
+            try:
+                data = json.loads(value)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                candidates += [v for v in data.values() if isinstance(v, str)]
+        for candidate in candidates:
+            if _jwt_payload(candidate) is not None:
+                return candidate
+    return None
+
+
+def token_expiry(session):
+    """回傳 token 的到期時間 (epoch 秒)，無法判斷時回傳 None"""
+    token = find_token(session)
+    if token is None:
+        return None
+    exp = _jwt_payload(token).get('exp')
+    return exp if isinstance(exp, (int, float)) else None
+
+
+def is_expired(session, max_age=12 * 3600, margin=60):
+    now = time.time()
+    exp = token_expiry(session)
+    if exp is not None:
+        return exp - margin <= now
+    return now - session.get('saved_at', 0) >= max_age
+
+
+class SessionCache:
+    def __init__(self, path=DEFAULT_PATH, max_age=12 * 3600):
+        self.path = path
+        self.max_age = max_age    # token 沒有 exp 時，快取最長沿用的秒數
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp = self.path + '.tmp'
+        # 內容等同登入憑證，只允許擁有者讀寫
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def load(self, base_url, username):
+        """取得未過期的 session，沒有或已過期時回傳 None"""
+        with self._lock:
+            session = self._read().get(f'{username}@{base_url}')
+        if not session or is_expired(session, self.max_age):
+            return None
+        return session
+
+    def save(self, base_url, username, session):
+        with self._lock:
+            data = self._read()
+            data[f'{username}@{base_url}'] = dict(session, saved_at=time.time())
+            self._write(data)
+
+    def invalidate(self, base_url, username):
+        with self._lock:
+            data = self._read()
+            if data.pop(f'{username}@{base_url}', None) is not None:
+                self._write(data)
+
+    def entry(self, base_url, username):
+        return CacheEntry(self, base_url, username)
+
+
+class CacheEntry:
+    """固定網站與帳號的快取項目，交給 StreamPool / HLSProbe 使用"""
+
+    def __init__(self, cache, base_url, username):
+        self.cache = cache
+        self.base_url = base_url
+        self.username = username
+
+    def load(self):
+        return self.cache.load(self.base_url, self.username)
+
+    def save(self, session):
+        self.cache.save(self.base_url, self.username, session)
+
+    def invalidate(self):
+        self.cache.invalidate(self.base_url, self.username)
+
+
+_default_cache = None
+
+
+def get_session_cache(log_dir=None):
+    """共用的登入快取；log_dir 只在第一次呼叫 (建立時) 有效"""
+    global _default_cache
+    if _default_cache is None:
+        path = os.path.join(log_dir, os.path.basename(DEFAULT_PATH)) if log_dir else DEFAULT_PATH
+        _default_cache = SessionCache(path)
+    return _default_cache
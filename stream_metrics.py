@@ -0,0 +1,283 @@
+"""串流延遲與吞吐量統計
+
+從監控已經收到的 Network 事件 (performance log、CDP 訂閱或 HLS 探測) 計算
+每個串流的滾動統計，所有樣本都放在固定大小的 ring buffer 中:
+
+- 片段 TTFB 與下載時間的百分位數 (response.timing / loadingFinished)
+- 有效傳輸速率 (encodedDataLength / 下載時間)
+- 播放清單更新間隔
+- 片段序號跳號與停滯偵測
+
+統計結果可以從本機 Prometheus 文字格式端點 (/metrics) 讀取，或定期寫入
+logs/stream_metrics.json。
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+error_logger = logging.getLogger('error_logger')
+
+SEGMENT_SEQUENCE = re.compile(r'(\d+)\.ts(?:\?|$)')
+PERCENTILES = (50, 90, 99)
+COUNTERS = ('segments', 'playlists', 'errors', 'bytes', 'sequence_gaps')
+
+
+def percentile(values, p):
+    """nearest-rank 百分位數，沒有樣本時回傳 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1
+    return ordered[index]
+
+
+class StreamStats:
+    def __init__(self, name, window):
+        self.name = name
+        self.ttfb = deque(maxlen=window)             # 毫秒
+        self.download_time = deque(maxlen=window)    # 毫秒
+        self.bitrate = deque(maxlen=window)          # bits/s
+        self.playlist_interval = deque(maxlen=window)  # 秒
+        self.segments = 0
+        self.playlists = 0
+        self.errors = 0
+        self.bytes = 0
+        self.sequence_gaps = 0
+        self.last_sequence = None
+        self.last_playlist_at = None
+        self.last_segment_wall = None
+
+    def summary(self, stall_seconds):
+        now = time.monotonic()
+        idle = None if self.last_segment_wall is None else now - self.last_segment_wall
+        result = {
+            'segments': self.segments,
+            'playlists': self.playlists,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'sequence_gaps': self.sequence_gaps,
+            'last_sequence': self.last_sequence,
+            'seconds_since_segment': None if idle is None else round(idle, 1),
+            'stalled': idle is not None and idle >= stall_seconds,
+        }
+        for key, samples in (('ttfb_ms', self.ttfb),
+                             ('download_ms', self.download_time),
+                             ('bitrate_bps', self.bitrate),
+                             ('playlist_interval_s', self.playlist_interval)):
+            values = list(samples)
+            for p in PERCENTILES:
+                value = percentile(values, p)
+                result[f'{key}_p{p}'] = None if value is None else round(value, 3)
+        return result
+
+
+class MetricsCollector:
+    def __init__(self, window=256, stall_seconds=30, max_pending=10000):
+        self.window = window                # 每個 ring buffer 保留的樣本數
+        self.stall_seconds = stall_seconds  # 超過幾秒沒有新片段視為停滯
+        self.max_pending = max_pending
+        self.streams = {}
+        self.browsers = {}                  # 瀏覽器實例名稱 -> RSS (bytes)
+        self.queues = {}                    # 佇列名稱 -> 回傳 stats dict 的函式
+        self._pending = {}                  # requestId -> (stats, requestTime, is_segment)
+        self._lock = threading.Lock()
+        self._server = None
+        self._reporter = None
+        self._stop = threading.Event()
+
+    def _stats(self, stream):
+        name = stream or 'default'
+        stats = self.streams.get(name)
+        if stats is None:
+            stats = self.streams[name] = StreamStats(name, self.window)
+        return stats
+
+    def observe(self, method, params, stream=None):
+        """記錄一個 Network 事件，與 handle_network_event 收到的格式相同"""
+        with self._lock:
+            if method == 'Network.responseReceived':
+                self._on_response(params, stream)
+            elif method == 'Network.loadingFinished':
+                self._on_finished(params)
+            elif method == 'Network.loadingFailed':
+                self._pending.pop(params.get('requestId'), None)
+                if '/Media1/live/' in params.get('url', ''):
+                    self._stats(stream).errors += 1
+
+    def _on_response(self, params, stream):
+        response = params['response']
+        url = response['url']
+        if '/Media1/live/' not in url:
+            return
+        is_segment = '.ts' in url
+        if not is_segment and '.m3u8' not in url:
+            return
+        stats = self._stats(stream)
+        if response['status'] >= 400:
+            stats.errors += 1
+            return
+
+        timing = response.get('timing') or {}
+        request_time = timing.get('requestTime')
+        if is_segment:
+            stats.segments += 1
+            stats.last_segment_wall = time.monotonic()
+            if timing.get('receiveHeadersEnd') is not None and timing.get('sendStart') is not None:
+                stats.ttfb.append(timing['receiveHeadersEnd'] - timing['sendStart'])
+            match = SEGMENT_SEQUENCE.search(url)
+            if match:
+                sequence = int(match.group(1))
+                if stats.last_sequence is not None and sequence > stats.last_sequence + 1:
+                    stats.sequence_gaps += sequence - stats.last_sequence - 1
+                if stats.last_sequence is None or sequence > stats.last_sequence:
+                    stats.last_sequence = sequence
+        else:
+            stats.playlists += 1
+            at = params.get('timestamp', time.monotonic())
+            if stats.last_playlist_at is not None and at > stats.last_playlist_at:
+                stats.playlist_interval.append(at - stats.last_playlist_at)
+            stats.last_playlist_at = at
+
+        request_id = params.get('requestId')
+        if request_id is not None and request_time is not None:
+            if len(self._pending) >= self.max_pending:
+                self._pending.pop(next(iter(self._pending)))
+            self._pending[request_id] = (stats, request_time, is_segment)
+
+    def _on_finished(self, params):
+        pending = self._pending.pop(params.get('requestId'), None)
+        if pending is None:
+            return
+        stats, request_time, is_segment = pending
+        size = params.get('encodedDataLength') or 0
+        stats.bytes += size
+        elapsed = params.get('timestamp', 0) - request_time
+        if is_segment and elapsed > 0:
+            stats.download_time.append(elapsed * 1000)
+            if size:
+                stats.bitrate.append(size * 8 / elapsed)
+
+    def set_browser_rss(self, name, rss):
+        with self._lock:
+            if rss is None:
+                self.browsers.pop(name, None)
+            else:
+                self.browsers[name] = rss
+
+    def add_queue(self, name, stats):
+        """登記背景佇列，stats() 回傳 depth / max_depth / dropped / capacity"""
+        with self._lock:
+            self.queues[name] = stats
+
+    def queue_snapshot(self):
+        with self._lock:
+            queues = dict(self.queues)
+        return {name: stats() for name, stats in queues.items()}
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.summary(self.stall_seconds) for name, stats in self.streams.items()}
+
+    def render_prometheus(self):
+        """輸出 Prometheus text exposition format"""
+        lines = []
+        snapshot = self.snapshot()
+        keys = []
+        for summary in snapshot.values():
+            keys = [k for k in summary if k != 'last_sequence']
+            break
+        for key in keys:
+            if key in COUNTERS:
+                metric = f'stream_monitor_{key}_total'
+                lines.append(f'# TYPE {metric} counter')
+            else:
+                metric = f'stream_monitor_{key}'
+                lines.append(f'# TYPE {metric} gauge')
+            for name, summary in snapshot.items():
+                value = summary[key]
+                if value is None:
+                    continue
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{metric}{{stream="{label}"}} {float(value)}')
+        with self._lock:
+            browsers = dict(self.browsers)
+        if browsers:
+            lines.append('# TYPE stream_monitor_browser_rss_bytes gauge')
+            for name, rss in browsers.items():
+                lines.append(f'stream_monitor_browser_rss_bytes{{browser="{name}"}} {float(rss)}')
+        queues = self.queue_snapshot()
+        for key, metric, kind in (('depth', 'stream_monitor_queue_depth', 'gauge'),
+                                  ('max_depth', 'stream_monitor_queue_max_depth', 'gauge'),
+                                  ('dropped', 'stream_monitor_queue_dropped_total', 'counter')):
+            if not queues:
+                break
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, stats in queues.items():
+                lines.append(f'{metric}{{queue="{name}"}} {float(stats[key])}')
+        return '\n'.join(lines) + '\n'
+
+    def write_summary(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            with self._lock:
+                browsers = dict(self.browsers)
+            json.dump({'timestamp': time.time(), 'streams': self.snapshot(), 'browsers': browsers,
+                       'queues': self.queue_snapshot()},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def serve(self, host='127.0.0.1', port=9108):
+        """在背景執行緒提供 /metrics 端點"""
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = collector.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+
+    def report_every(self, path, interval=30):
+        """每 interval 秒把統計寫入 path"""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.write_summary(path)
+                except Exception as e:
+                    error_logger.error(f'寫入串流統計時發生錯誤: {str(e)}')
+
+        self._reporter = threading.Thread(target=run, name='metrics-report', daemon=True)
+        self._reporter.start()
+
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+_default_collector = None
+
+
+def get_metrics():
+    global _default_collector
+    if _default_collector is None:
+        _default_collector = MetricsCollector()
+    return _default_collector
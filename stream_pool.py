@@ -0,0 +1,358 @@
+"""多串流監控: 以有限數量的瀏覽器執行多個串流分頁，共用同一次登入
+
+每個瀏覽器由一個 BrowserWorker 執行緒獨佔 (WebDriver 不是 thread-safe)，
+每個串流開在該瀏覽器的一個分頁中。ChromeDriver 的 performance log 會在
+每筆記錄帶上來源分頁的 webview (即 DevTools target id)，據此把事件分派到
+對應的串流。
+
+登入只在第一個瀏覽器執行一次，之後把 cookies 與 localStorage 複製到其他
+瀏覽器；session 失效 (分頁被導回登入頁) 時才重新登入並更新共用的 session。
+Angular 的路由守衛在頁面載入後才會導向登入頁，因此開啟分頁後要等到出現
+登入表單或播放器 (page_state)，不能只看 body 載入當下的網址。
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from async_logging import console
+from log_ingest import LogIngestor
+from resource_usage import driver_rss
+from stream_metrics import get_metrics
+
+error_logger = logging.getLogger('error_logger')
+
+LOGIN_FORM_SELECTOR = "input[formcontrolname='account']"
+PLAYER_SELECTOR = 'video'    # 串流頁面登入後才會出現的播放器
+
+_LOCAL_STORAGE_DUMP = """
+var data = {};
+for (var i = 0; i < window.localStorage.length; i++) {
+    var key = window.localStorage.key(i);
+    data[key] = window.localStorage.getItem(key);
+}
+return data;
+"""
+
+_LOCAL_STORAGE_LOAD = """
+var data = arguments[0];
+for (var key in data) {
+    window.localStorage.setItem(key, data[key]);
+}
+"""
+
+
+def export_session(driver):
+    """取出目前瀏覽器的登入狀態 (cookies 與 localStorage)"""
+    return {
+        'cookies': driver.get_cookies(),
+        'local_storage': driver.execute_script(_LOCAL_STORAGE_DUMP) or {},
+    }
+
+
+def apply_session(driver, base_url, session):
+    """把登入狀態寫入另一個瀏覽器，寫入前必須先開啟同一網域的頁面"""
+    driver.get(base_url)
+    for cookie in session.get('cookies', []):
+        try:
+            driver.add_cookie(cookie)
+        except Exception as e:
+            error_logger.error(f'寫入cookie失敗: {cookie.get("name")} - {str(e)}')
+    if session.get('local_storage'):
+        driver.execute_script(_LOCAL_STORAGE_LOAD, session['local_storage'])
+
+
+def page_state(driver, timeout=10):
+    """等待頁面出現登入表單 (或被導向 /login) 或播放器
+
+    回傳 'login'、'ready'，時間內兩者都沒有出現時回傳 None。
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    def settled(driver):
+        if '/login' in driver.current_url or driver.find_elements(By.CSS_SELECTOR, LOGIN_FORM_SELECTOR):
+            return 'login'
+        if driver.find_elements(By.CSS_SELECTOR, PLAYER_SELECTOR):
+            return 'ready'
+        return False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(settled)
+    except TimeoutException:
+        return None
+
+
+def stream_url(base_url, stream):
+    """串流可以是完整網址或 case id"""
+    stream = str(stream)
+    if stream.startswith(('http://', 'https://')):
+        return stream
+    return f'{base_url}/case-live/{stream}'
+
+
+def _target_id(handle):
+    # 舊版 ChromeDriver 的 window handle 帶有 CDwindow- 前綴
+    return handle[len('CDwindow-'):] if handle.startswith('CDwindow-') else handle
+
+
+class Stream:
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.handle = None
+        self.last_media = time.monotonic()
+        self.restarts = 0
+
+
+class BrowserWorker(threading.Thread):
+    def __init__(self, pool, index, streams):
+        super().__init__(name=f'browser-{index}', daemon=True)
+        self.pool = pool
+        self.index = index
+        self.streams = streams
+        self.by_target = {}
+        self.ingestor = None
+        self.driver = None
+        self.session = None
+        self.failures = 0
+        self.started_at = 0.0
+        self.rss_reported_at = 0.0
+        self.changes = deque()  # 由 StreamPool.update 放入的 ('add' | 'remove', stream)
+        self.blank_handle = None  # 最後一個串流移除後保留的空白分頁，下一個新增的串流沿用
+
+    def run(self):
+        while not self.pool.stop_event.is_set():
+            try:
+                self._apply_changes()
+                if not self.streams:
+                    # 所有串流都已移除，關閉瀏覽器等待新的串流
+                    self._quit()
+                    self.pool.stop_event.wait(1)
+                    continue
+                if self.driver is None:
+                    self._start()
+                self._poll()
+                self._supervise()
+                self._housekeeping()
+                self.failures = 0
+                self.pool.stop_event.wait(self.pool.poll_interval)
+            except Exception as e:
+                self.failures += 1
+                error_logger.error(f'[{self.name}] 瀏覽器發生錯誤，準備重新啟動: {str(e)}')
+                console(f'\n[{self.name}] 瀏覽器發生錯誤，準備重新啟動: {str(e)}')
+                self._quit()
+                # 連續失敗時逐步拉長等待時間
+                self.pool.stop_event.wait(min(60, 2 ** self.failures))
+        self._quit()
+
+    def _start(self):
+        self.driver = self.pool.driver_factory()
+        self.started_at = time.monotonic()
+        self.session = self.pool.authorize(self.driver)
+        self.ingestor = LogIngestor()
+        self.by_target = {}
+        first = True
+        for stream in self.streams:
+            if not first:
+                self.driver.switch_to.new_window('tab')
+            first = False
+            self._open(stream)
+        console(f'[{self.name}] 已開始監控 {len(self.streams)} 個串流')
+
+    def _apply_changes(self):
+        """在本執行緒上開啟或關閉分頁 (WebDriver 不是 thread-safe)"""
+        while self.changes:
+            action, stream = self.changes.popleft()
+            if action == 'add':
+                self.streams.append(stream)
+                if self.driver is not None:
+                    if self.blank_handle is not None:
+                        self.driver.switch_to.window(self.blank_handle)
+                        self.blank_handle = None
+                    else:
+                        self.driver.switch_to.new_window('tab')
+                    self._open(stream)
+                console(f'[{self.name}] 新增串流: {stream.name}')
+            elif stream in self.streams:
+                self.streams.remove(stream)
+                if self.driver is not None and stream.handle is not None:
+                    self.driver.switch_to.window(stream.handle)
+                    if self.streams:
+                        self.driver.close()
+                        self.driver.switch_to.window(self.streams[0].handle)
+                    else:
+                        # 瀏覽器至少要留一個分頁: 停止播放，留給同一批之後新增的串流
+                        self.driver.get('about:blank')
+                        self.blank_handle = stream.handle
+                if stream.handle is not None:
+                    self.by_target.pop(_target_id(stream.handle), None)
+                console(f'[{self.name}] 移除串流: {stream.name}')
+
+    def _open(self, stream):
+        self.driver.get(stream.url)
+        if page_state(self.driver) == 'login':
+            # session 已失效，重新登入後再開一次
+            self.session = self.pool.authorize(self.driver, stale=self.session)
+            self.driver.get(stream.url)
+        if stream.handle is not None:
+            self.by_target.pop(_target_id(stream.handle), None)
+        stream.handle = self.driver.current_window_handle
+        stream.last_media = time.monotonic()
+        self.by_target[_target_id(stream.handle)] = stream
+
+    def _poll(self):
+        for webview, method, params in self.ingestor.read(self.driver):
+            try:
+                stream = self.by_target.get(webview)
+                if stream is None:
+                    continue
+                if method == 'Network.responseReceived':
+                    stream.last_media = time.monotonic()
+                self.pool.event_handler(method, params, stream=stream.name)
+            except Exception as e:
+                error_logger.error(f'[{self.name}] 處理日誌時發生錯誤: {str(e)}')
+
+    def _supervise(self):
+        now = time.monotonic()
+        for stream in self.streams:
+            idle = now - stream.last_media
+            if idle < self.pool.stall_timeout:
+                continue
+            stream.restarts += 1
+            error_logger.error(f'[{stream.name}] {idle:.0f} 秒沒有串流請求，重新載入分頁 (第 {stream.restarts} 次)')
+            self.pool.save_error({
+                'timestamp': datetime.now().isoformat(),
+                'stream': stream.name,
+                'url': stream.url,
+                'error_type': 'STREAM_STALLED',
+                'idle_seconds': round(idle, 1),
+                'restarts': stream.restarts,
+            })
+            self.driver.switch_to.window(stream.handle)
+            self._open(stream)
+
+    def _housekeeping(self):
+        now = time.monotonic()
+        if now - self.rss_reported_at >= self.pool.rss_interval:
+            self.rss_reported_at = now
+            rss = driver_rss(self.driver)
+            get_metrics().set_browser_rss(self.name, rss)
+            if rss is not None:
+                logging.info(f'[{self.name}] 瀏覽器記憶體用量: {rss / 1024 / 1024:.1f} MB')
+
+        recycle_interval = self.pool.recycle_interval
+        if recycle_interval and now - self.started_at >= recycle_interval:
+            # 定期重新啟動瀏覽器以釋放記憶體，下一輪會以共用 session 重新開啟分頁
+            console(f'[{self.name}] 定期重新啟動瀏覽器')
+            self._quit()
+
+    def _quit(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        self.driver = None
+        self.blank_handle = None
+
+
+class StreamPool:
+    """把串流分配到最多 max_drivers 個瀏覽器，每個瀏覽器最多 streams_per_driver 個分頁"""
+
+    def __init__(self, base_url, driver_factory, login_func, event_handler, save_error,
+                 max_drivers=4, streams_per_driver=8, poll_interval=0.1, stall_timeout=60,
+                 recycle_interval=None, rss_interval=60, session_cache=None):
+        self.base_url = base_url
+        self.driver_factory = driver_factory
+        self.login_func = login_func
+        self.event_handler = event_handler
+        self.save_error = save_error
+        self.max_drivers = max_drivers
+        self.streams_per_driver = streams_per_driver
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.recycle_interval = recycle_interval  # 每個瀏覽器最長執行秒數
+        self.rss_interval = rss_interval          # 記錄記憶體用量的間隔秒數
+        self.session_cache = session_cache        # session_cache.CacheEntry，跨重新啟動沿用登入狀態
+
+        self.stop_event = threading.Event()
+        self.workers = []
+        self.assignments = {}   # 串流名稱 -> (worker, Stream)
+        self.session = None
+        self._session_lock = threading.Lock()
+
+    def authorize(self, driver, stale=None):
+        """第一個瀏覽器執行完整登入，其他瀏覽器直接套用共用的 session
+
+        stale 是呼叫端發現已失效的 session；若其他瀏覽器已經重新登入過，
+        直接套用新的 session 即可，不必再登入一次。有 session_cache 時，
+        第一個瀏覽器會先套用上次儲存的 session，失效才執行完整登入。
+        """
+        with self._session_lock:
+            if stale is not None and self.session is stale:
+                self.session = None
+                if self.session_cache is not None:
+                    self.session_cache.invalidate()
+            if self.session is None and self.session_cache is not None:
+                self.session = self.session_cache.load()
+            if self.session is None:
+                if not self.login_func(driver):
+                    raise Exception('登入失敗')
+                self.session = export_session(driver)
+                if self.session_cache is not None:
+                    self.session_cache.save(self.session)
+                return self.session
+            session = self.session
+        apply_session(driver, self.base_url, session)
+        return session
+
+    def start(self, streams):
+        streams = [Stream(str(s), stream_url(self.base_url, s)) for s in streams]
+        count = min(self.max_drivers, max(1, math.ceil(len(streams) / self.streams_per_driver)))
+        for index in range(count):
+            worker = BrowserWorker(self, index, streams[index::count])
+            for stream in worker.streams:
+                self.assignments[stream.name] = (worker, stream)
+            self.workers.append(worker)
+            worker.start()
+
+    def update(self, streams):
+        """套用新的串流清單，只開關有變動的分頁，不重新啟動瀏覽器"""
+        wanted = {str(s): stream_url(self.base_url, s) for s in streams}
+        for name, (worker, stream) in list(self.assignments.items()):
+            if wanted.get(name) != stream.url:
+                del self.assignments[name]
+                worker.changes.append(('remove', stream))
+        for name, url in wanted.items():
+            if name in self.assignments:
+                continue
+            stream = Stream(name, url)
+            worker = self._least_loaded()
+            if worker is None:
+                worker = BrowserWorker(self, len(self.workers), [stream])
+                self.workers.append(worker)
+                worker.start()
+            else:
+                worker.changes.append(('add', stream))
+            self.assignments[name] = (worker, stream)
+
+    def _least_loaded(self):
+        """串流最少的瀏覽器；都已滿且還能再開瀏覽器時回傳 None"""
+        loads = {worker: 0 for worker in self.workers}
+        for worker, _ in self.assignments.values():
+            loads[worker] += 1
+        worker = min(loads, key=loads.get, default=None)
+        if worker is None or (loads[worker] >= self.streams_per_driver
+                              and len(self.workers) < self.max_drivers):
+            return None
+        return worker
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout)
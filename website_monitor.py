@@ -1,49 +1,174 @@
 import time
 import logging
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-import json
+import argparse
+import getpass
 import os
-import tkinter as tk
-from tkinter import simpledialog, messagebox
-
-# 創建logs目錄
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-
-# 配置一般日誌
-logging.basicConfig(
-    filename='logs/website_monitor.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    encoding='utf-8'
-)
-
-# 配置錯誤日誌
+import threading
+from error_store import get_default_store
+from error_aggregator import get_default_aggregator
+import async_logging
+from async_logging import console
+from stream_metrics import get_metrics
+from resource_usage import driver_rss
+from log_ingest import LogIngestor, ingestor_for
+from monitor_config import DEFAULT_TARGET, DEFAULT_USERNAME, playlist_name
+from session_cache import get_session_cache
+
+# selenium 與 tkinter 只在實際用到時才匯入，匯入本模組不會建立檔案或日誌 handler
 error_logger = logging.getLogger('error_logger')
-error_handler = logging.FileHandler('logs/error.log', encoding='utf-8')
-error_handler.setLevel(logging.ERROR)
-error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-error_handler.setFormatter(error_formatter)
-error_logger.addHandler(error_handler)
 
-def setup_driver():
+def setup_logging(log_dir='logs'):
+    """建立日誌目錄並設定一般日誌與錯誤日誌，重複呼叫無作用"""
+    if error_logger.handlers:
+        return
+    # 創建logs目錄
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    
+    # 配置一般日誌
+    logging.basicConfig(
+        filename=os.path.join(log_dir, 'website_monitor.log'),
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        encoding='utf-8'
+    )
+    
+    # 配置錯誤日誌
+    error_handler = logging.FileHandler(os.path.join(log_dir, 'error.log'), encoding='utf-8')
+    error_handler.setLevel(logging.ERROR)
+    error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    error_handler.setFormatter(error_formatter)
+    error_logger.addHandler(error_handler)
+
+def setup_driver(profile='default', capture=None):
+    """建立 Chrome WebDriver
+
+    profile='monitor' 為長時間監控用的低資源設定: 無頭模式、小視窗、
+    performance log 只記錄 Network domain、不載入圖片、不使用GPU解碼，
+    並限制磁碟快取大小。
+    capture 為 replay.CaptureWriter 時，performance log 會同時寫入錄製檔。
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    
     # 設置 Chrome 選項
     chrome_options = Options()
     # chrome_options.add_argument('--headless')  # 註釋掉無頭模式
     chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    if profile == 'monitor':
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--window-size=800,600')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-accelerated-video-decode')
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--disk-cache-size=33554432')
+        chrome_options.add_argument('--media-cache-size=33554432')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--no-first-run')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+        })
+        # performance log 只保留 Network domain 事件
+        chrome_options.add_experimental_option('perfLoggingPrefs', {
+            'enableNetwork': True,
+            'enablePage': False,
+        })
+    # 多串流模式下串流開在背景分頁，避免背景分頁被節流而暫停播放
+    chrome_options.add_argument('--disable-background-timer-throttling')
+    chrome_options.add_argument('--disable-backgrounding-occluded-windows')
+    chrome_options.add_argument('--disable-renderer-backgrounding')
+    chrome_options.add_argument('--autoplay-policy=no-user-gesture-required')
     
     # 初始化 WebDriver
     driver = webdriver.Chrome(options=chrome_options)
-    driver.maximize_window()  # 最大化視窗
+    if profile != 'monitor':
+        driver.maximize_window()  # 最大化視窗
+    if capture is not None:
+        from replay import CapturingDriver
+        driver = CapturingDriver(driver, capture)
+    return driver
+
+def report_driver_rss(driver, name='browser'):
+    """記錄瀏覽器實例目前的記憶體用量並提供給統計端點"""
+    rss = driver_rss(driver)
+    get_metrics().set_browser_rss(name, rss)
+    if rss is not None:
+        logging.info(f'[{name}] 瀏覽器記憶體用量: {rss / 1024 / 1024:.1f} MB')
+    return rss
+
+def rss_reporter(driver, interval=60, name='browser'):
+    """回傳一個函式，每次呼叫時若距上次記錄超過 interval 秒就記錄記憶體用量"""
+    reported_at = None
+
+    def report():
+        nonlocal reported_at
+        if reported_at is None or time.monotonic() - reported_at >= interval:
+            reported_at = time.monotonic()
+            report_driver_rss(driver, name)
+
+    return report
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        error_logger.error(f'關閉瀏覽器時發生錯誤: {str(e)}')
+
+def recycle_driver(driver, login_url, target_url, username, password, profile='default', capture=None):
+    """重新啟動瀏覽器以釋放長時間執行累積的記憶體，沿用原本的登入狀態
+
+    原本的瀏覽器一定會被關閉 (driver 可以是 None)；新的瀏覽器無法登入時
+    也會關閉後再拋出例外，呼叫端不會留下執行中的 Chrome。
+    """
+    from stream_pool import export_session
+
+    session = None
+    if driver is not None:
+        try:
+            report_driver_rss(driver)
+            session = export_session(driver)
+        except Exception as e:
+            error_logger.error(f'取得登入狀態失敗: {str(e)}')
+        quit_driver(driver)
+    
+    driver = setup_driver(profile, capture)
+    try:
+        restore_or_login(driver, login_url, target_url, username, password, session)
+    except Exception:
+        quit_driver(driver)
+        raise
+    print("瀏覽器已重新啟動")
     return driver
 
+def restore_or_login(driver, login_url, target_url, username, password, session=None):
+    """套用 session (未指定時使用快取) 並進入目標頁面，出現登入表單時才執行完整登入"""
+    from stream_pool import export_session, apply_session, page_state
+
+    base_url = login_url.rsplit('/login', 1)[0]
+    cache = get_session_cache()
+    if session is None:
+        session = cache.load(base_url, username)
+    if session is not None:
+        apply_session(driver, base_url, session)
+        # 串流中斷時播放器可能一直不出現 (None)，只有出現登入表單才視為失效
+        if navigate_to_page(driver, target_url) and page_state(driver) != 'login':
+            return
+        # 登入狀態已失效，重新登入
+        cache.invalidate(base_url, username)
+    if not login(driver, login_url, username, password):
+        raise Exception("登入失敗")
+    cache.save(base_url, username, export_session(driver))
+    if not navigate_to_page(driver, target_url):
+        raise Exception("無法進入目標頁面")
+
 def login(driver, login_url, username, password):
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.by import By
+    
     try:
         print("正在進行登入...")
         driver.get(login_url)
@@ -67,17 +192,14 @@ def login(driver, login_url, username, password):
         print("2")
         
         # 等待登入API請求完成
+        login_ingestor = LogIngestor(url_filters=('APIPath/api/user/login',),
+                                     methods=('Network.responseReceived',))
+
         def check_login_status(driver):
-            logs = driver.get_log('performance')
-            for entry in logs:
+            for _, _, params in login_ingestor.read(driver):
                 try:
-                    log = json.loads(entry['message'])['message']
-                    if ('Network.responseReceived' == log['method']):
-                        response = log['params']['response']
-                        url = response['url']
-                        if 'APIPath/api/user/login' in url:
-                            return response['status'] == 200
-                except:
+                    return params['response']['status'] == 200
+                except KeyError:
                     continue
             return False
 
@@ -91,7 +213,7 @@ def login(driver, login_url, username, password):
             if 'library-list' in driver.current_url:
                 success = True
                 break
-            time.sleep(0.5)
+            time.sleep(0.1)
         
         if not success:
             raise Exception("登入超時或失敗")
@@ -111,6 +233,10 @@ def login(driver, login_url, username, password):
         return False
 
 def navigate_to_page(driver, target_url):
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.by import By
+    
     try:
         print(f"正在導航到目標頁面: {target_url}")
         driver.get(target_url)
@@ -129,124 +255,211 @@ def navigate_to_page(driver, target_url):
         return False
 
 def save_error_details(error_data):
-    """保存詳細錯誤信息到JSON文件"""
-    error_log_file = 'logs/stream_errors.json'
+    """保存詳細錯誤信息到JSONL錯誤記錄 (僅附加，批次寫入)"""
     try:
-        # 讀取現有的錯誤記錄
-        existing_errors = []
-        if os.path.exists(error_log_file):
-            with open(error_log_file, 'r', encoding='utf-8') as f:
-                try:
-                    existing_errors = json.load(f)
-                except json.JSONDecodeError:
-                    existing_errors = []
-        
-        # 添加新的錯誤記錄
-        existing_errors.append(error_data)
-        
-        # 寫入更新後的錯誤記錄
-        with open(error_log_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_errors, f, ensure_ascii=False, indent=2)
-        
-        error_logger.error(f'錯誤信息已添加到: {error_log_file}')
+        get_default_store().append(error_data)
     except Exception as e:
         error_logger.error(f'保存錯誤詳情時發生錯誤: {str(e)}')
 
+def maybe_flush_errors():
+    """由監控迴圈定期呼叫: 結束閒置的錯誤事件，並寫出錯誤記錄緩衝區"""
+    get_default_aggregator().expire()
+    get_default_store().maybe_flush()
+
+def flush_errors():
+    """監控停止時呼叫: 寫出所有進行中錯誤事件的彙總與緩衝區"""
+    get_default_aggregator().close()
+    get_default_store().flush()
+
+def handle_network_event(method, params, stream=None):
+    """處理單一 Network 事件 (來源可以是 performance log 或 CDP 訂閱)
+
+    stream 為多串流模式下事件所屬的串流名稱，會一併寫入錯誤記錄。
+    """
+    get_metrics().observe(method, params, stream)
+    
+    if 'Network.responseReceived' == method:
+        response = params['response']
+        url = response['url']
+        
+        # 監控串流檔案請求
+        if '/Media1/live/' in url and ('.m3u8' in url or '.ts' in url):
+            status = response['status']
+            content_type = response.get('headers', {}).get('content-type', '')
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            file_name = url.split('/')[-1]  # 取得檔案名稱
+            
+            # 只在發生錯誤時顯示和記錄
+            if status >= 400:
+                error_data = {
+                    'timestamp': datetime.now().isoformat(),
+                    'file_name': file_name,
+                    'url': url,
+                    'status': status,
+                    'content_type': content_type,
+                    'headers': response.get('headers', {}),
+                    'error_type': 'STREAM_ERROR'
+                }
+                if stream:
+                    error_data['stream'] = stream
+                # 同一串流、同一狀態碼的連續錯誤只顯示與記錄第一筆
+                if not get_default_aggregator().report(error_data, status):
+                    return
+                lines = [f'\n[{current_time}] 串流檔案請求失敗!']
+                if stream:
+                    lines.append(f'串流: {stream}')
+                lines += [
+                    f'檔案: {file_name}',
+                    f'URL: {url}',
+                    f'狀態碼: {status}',
+                    f'Content-Type: {content_type}',
+                    '-' * 80,
+                ]
+                console('\n'.join(lines))
+                error_logger.error(f'串流檔案載入失敗: {file_name} - 狀態碼: {status}')
+            else:
+                get_default_aggregator().recover(stream, url)
+    
+    elif 'Network.loadingFailed' == method:
+        url = params.get('url', 'Unknown URL')
+        if '/Media1/live/' in url and ('.m3u8' in url or '.ts' in url):
+            error_text = params.get('errorText', 'Unknown error')
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            file_name = url.split('/')[-1]
+            
+            # print(f'\n[{current_time}] 串流檔案載入失敗!')
+            # print(f'檔案: {file_name}')
+            # print(f'URL: {url}')
+            # print(f'錯誤: {error_text}')
+            # print('-' * 80)
+            
+            error_data = {
+                'timestamp': datetime.now().isoformat(),
+                'file_name': file_name,
+                'url': url,
+                'error_type': 'STREAM_LOADING_FAILED',
+                'error_text': error_text,
+                'params': params
+            }
+            if stream:
+                error_data['stream'] = stream
+            if get_default_aggregator().report(error_data, error_text):
+                error_logger.error(f'串流檔案載入失敗: {file_name} - 錯誤: {error_text}')
+
 def process_browser_logs(driver):
-    logs = driver.get_log('performance')
+    # 先以字串過濾原始訊息，只解碼串流相關的事件
+    events = ingestor_for(driver).read(driver)
     
-    for entry in logs:
+    for _, method, params in events:
         try:
-            log = json.loads(entry['message'])['message']
-            if 'Network.response' in log['method'] or 'Network.request' in log['method']:
-                if 'Network.responseReceived' == log['method']:
-                    response = log['params']['response']
-                    url = response['url']
-                    
-                    # 監控串流檔案請求
-                    if '/Media1/live/' in url and ('.m3u8' in url or '.ts' in url):
-                        status = response['status']
-                        content_type = response.get('headers', {}).get('content-type', '')
-                        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        file_name = url.split('/')[-1]  # 取得檔案名稱
-                        
-                        # 只在發生錯誤時顯示和記錄
-                        if status >= 400:
-                            print(f'\n[{current_time}] 串流檔案請求失敗!')
-                            print(f'檔案: {file_name}')
-                            print(f'URL: {url}')
-                            print(f'狀態碼: {status}')
-                            print(f'Content-Type: {content_type}')
-                            print('-' * 80)
-                            
-                            error_data = {
-                                'timestamp': datetime.now().isoformat(),
-                                'file_name': file_name,
-                                'url': url,
-                                'status': status,
-                                'content_type': content_type,
-                                'headers': response.get('headers', {}),
-                                'error_type': 'STREAM_ERROR'
-                            }
-                            error_logger.error(f'串流檔案載入失敗: {file_name} - 狀態碼: {status}')
-                            save_error_details(error_data)
-                
-                elif 'Network.loadingFailed' == log['method']:
-                    params = log['params']
-                    url = params.get('url', 'Unknown URL')
-                    if '/Media1/live/' in url and ('.m3u8' in url or '.ts' in url):
-                        error_text = params.get('errorText', 'Unknown error')
-                        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        file_name = url.split('/')[-1]
-                        
-                        # print(f'\n[{current_time}] 串流檔案載入失敗!')
-                        # print(f'檔案: {file_name}')
-                        # print(f'URL: {url}')
-                        # print(f'錯誤: {error_text}')
-                        # print('-' * 80)
-                        
-                        error_data = {
-                            'timestamp': datetime.now().isoformat(),
-                            'file_name': file_name,
-                            'url': url,
-                            'error_type': 'STREAM_LOADING_FAILED',
-                            'error_text': error_text,
-                            'params': params
-                        }
-                        error_logger.error(f'串流檔案載入失敗: {file_name} - 錯誤: {error_text}')
-                        save_error_details(error_data)
-
-        except json.JSONDecodeError:
-            continue
+            handle_network_event(method, params)
         except Exception as e:
             error_logger.error(f'處理日誌時發生錯誤: {str(e)}')
-            print(f'\n處理日誌時發生錯誤: {str(e)}')
+            console(f'\n處理日誌時發生錯誤: {str(e)}')
+
+def discard_performance_log(driver):
+    """清空 ChromeDriver 累積的 performance log (CDP 訂閱模式不會讀取它)"""
+    from replay import CapturingDriver
+
+    # CDP 事件已經另外錄製，不再把 performance log 寫入錄製檔
+    if isinstance(driver, CapturingDriver):
+        driver = driver._driver
+    driver.get_log('performance')
+
+def watch_network_events(driver, duration=None, drain_interval=10, on_tick=None):
+    """以 CDP 事件訂閱取代輪詢，直到連線中斷或經過 duration 秒才返回
+
+    performance log 仍需保留給輪詢備援模式與錄製使用，因此每 drain_interval
+    秒清空一次，避免多日執行時 ChromeDriver 無限累積記錄。
+    on_tick 會與錯誤記錄寫出一起定期被呼叫。
+    """
+    from cdp_listener import listen_network_events
 
-def monitor_website(login_url, target_url, username, password):
-    driver = setup_driver()
+    capture = getattr(driver, 'writer', None)
+    drained_at = time.monotonic()
+
+    extra_tick = on_tick
+
+    def on_tick():
+        nonlocal drained_at
+        maybe_flush_errors()
+        if extra_tick is not None:
+            extra_tick()
+        if time.monotonic() - drained_at >= drain_interval:
+            drained_at = time.monotonic()
+            try:
+                discard_performance_log(driver)
+            except Exception as e:
+                error_logger.error(f'清空performance log時發生錯誤: {str(e)}')
+
+    def on_event(method, params):
+        try:
+            if capture is not None:
+                capture.write_event(method, params)
+            handle_network_event(method, params)
+        except Exception as e:
+            error_logger.error(f'處理CDP事件時發生錯誤: {str(e)}')
+            console(f'\n處理CDP事件時發生錯誤: {str(e)}')
+
+    listen_network_events(driver, on_event, on_tick=on_tick,
+                          duration=duration)
+
+def monitor_website(login_url, target_url, username, password, use_cdp=True,
+                    profile='default', recycle_interval=None, capture=None):
+    driver = None
     try:
-        # 執行登入
-        if not login(driver, login_url, username, password):
-            raise Exception("登入失敗")
-        
-        # 導航到目標頁面
-        if not navigate_to_page(driver, target_url):
-            raise Exception("無法進入目標頁面")
+        driver = setup_driver(profile, capture)
+        # 沿用上次儲存的登入狀態並導航到目標頁面，失效時才執行登入
+        restore_or_login(driver, login_url, target_url, username, password)
         
         # print("\n開始監控串流檔案...")
         # print("監控中 (僅顯示錯誤)...")
         # print('-' * 80)
         
-        # 持續監控
         while True:
-            try:
-                process_browser_logs(driver)
-                time.sleep(0.1)  # 更頻繁地檢查，因為串流檔案請求較頻繁
-            except Exception as e:
-                # print(f"\n監控過程中發生錯誤: {str(e)}")
-                # print("嘗試繼續監控...")
-                time.sleep(1)
-                continue
+            # recycle_interval 秒後重新啟動瀏覽器，避免多日執行時記憶體持續增長
+            deadline = time.monotonic() + recycle_interval if recycle_interval else None
+            report_rss = rss_reporter(driver)
+            report_rss()
+            
+            # 優先使用CDP事件訂閱，無法使用時退回輪詢模式
+            if use_cdp:
+                try:
+                    watch_network_events(driver, recycle_interval, on_tick=report_rss)
+                    if deadline is None or time.monotonic() < deadline:
+                        raise Exception('CDP連線已關閉')
+                except Exception as e:
+                    use_cdp = False
+                    error_logger.error(f'CDP事件訂閱中斷，改用輪詢模式: {str(e)}')
+                    console(f'\nCDP事件訂閱中斷，改用輪詢模式: {str(e)}')
+            
+            # 持續監控
+            while not use_cdp and (deadline is None or time.monotonic() < deadline):
+                try:
+                    process_browser_logs(driver)
+                    maybe_flush_errors()
+                    report_rss()
+                    time.sleep(0.1)  # 更頻繁地檢查，因為串流檔案請求較頻繁
+                except Exception as e:
+                    # print(f"\n監控過程中發生錯誤: {str(e)}")
+                    # print("嘗試繼續監控...")
+                    time.sleep(1)
+                    continue
+            
+            # 重新啟動失敗 (例如暫時無法登入) 時逐步拉長間隔重試，不結束監控
+            failures = 0
+            while True:
+                try:
+                    driver = recycle_driver(driver, login_url, target_url, username, password,
+                                            profile, capture)
+                    break
+                except Exception as e:
+                    # recycle_driver 已關閉新舊兩個瀏覽器
+                    driver = None
+                    failures += 1
+                    error_logger.error(f'重新啟動瀏覽器失敗 (第 {failures} 次): {str(e)}')
+                    console(f'\n重新啟動瀏覽器失敗 (第 {failures} 次): {str(e)}')
+                    time.sleep(min(60, 2 ** failures))
             
     except Exception as e:
         error_data = {
@@ -260,9 +473,85 @@ def monitor_website(login_url, target_url, username, password):
         save_error_details(error_data)
         print(f'\n發生錯誤: {str(e)}')
     finally:
-        driver.quit()
+        flush_errors()
+        if driver is not None:
+            quit_driver(driver)
+
+def monitor_streams(login_url, base_url, streams, username, password,
+                    max_drivers=4, streams_per_driver=8, profile='default', recycle_interval=None,
+                    capture=None):
+    """同時監控多個串流，共用一次登入與有限數量的瀏覽器"""
+    from stream_pool import StreamPool
+
+    pool = StreamPool(
+        base_url,
+        driver_factory=lambda: setup_driver(profile, capture),
+        login_func=lambda driver: login(driver, login_url, username, password),
+        event_handler=handle_network_event,
+        save_error=save_error_details,
+        max_drivers=max_drivers,
+        streams_per_driver=streams_per_driver,
+        recycle_interval=recycle_interval,
+        session_cache=get_session_cache().entry(base_url, username),
+    )
+    pool.start(streams)
+    try:
+        while True:
+            maybe_flush_errors()
+            time.sleep(0.5)
+    finally:
+        pool.stop()
+        flush_errors()
+
+def monitor_playlists(base_url, playlists, username, password):
+    """不開瀏覽器，直接以HTTP探測HLS播放清單與片段"""
+    from hls_probe import HLSProbe
+
+    probe = HLSProbe(handle_network_event, save_error_details,
+                     session_cache=get_session_cache().entry(base_url, username))
+    try:
+        probe.login(base_url, username, password, check_url=playlists[0])
+    except Exception as e:
+        # 播放清單不一定需要登入，失敗時仍繼續探測
+        error_logger.error(f'探測模式登入失敗: {str(e)}')
+        print(f'探測模式登入失敗: {str(e)}')
+    for url in playlists:
+        probe.add(playlist_name(url), url)
+    probe.start()
+    print(f'開始探測 {len(playlists)} 個播放清單')
+    try:
+        while True:
+            maybe_flush_errors()
+            time.sleep(0.5)
+    finally:
+        probe.stop()
+        flush_errors()
+
+def replay_capture(path, speed=0, username=DEFAULT_USERNAME, password=''):
+    """以錄製檔重播，讓登入偵測與串流錯誤處理在沒有網站的環境下執行"""
+    from replay import ReplayDriver
+
+    driver = ReplayDriver(path, speed=speed)
+    started = time.monotonic()
+    # 錄製檔包含登入API回應時，一併重播登入偵測
+    logged_in = None
+    if any('APIPath/api/user/login' in str(record.get('message') or record.get('params'))
+           for record in driver.records):
+        logged_in = login(driver, 'http://replay/login', username, password)
+    while not driver.finished:
+        process_browser_logs(driver)
+        maybe_flush_errors()
+        if speed:
+            time.sleep(0.05)
+    flush_errors()
+    elapsed = time.monotonic() - started
+    print(f'重播完成: {len(driver.records)} 筆記錄，耗時 {elapsed:.2f} 秒，登入偵測: {logged_in}')
+    return driver
 
 def get_base_url():
+    import tkinter as tk
+    from tkinter import simpledialog, messagebox
+    
     # 創建主窗口但不顯示
     root = tk.Tk()
     root.withdraw()
@@ -291,17 +580,93 @@ def get_base_url():
     return base_url
 
 if __name__ == '__main__':
+    # 命令列參數為要同時監控的 case id 或串流頁面網址，
+    # .m3u8 網址則改用不開瀏覽器的探測模式
+    parser = argparse.ArgumentParser(description='串流網站監控')
+    parser.add_argument('streams', nargs='*', help='case id、串流頁面網址或 .m3u8 網址')
+    parser.add_argument('--profile', choices=('default', 'monitor'), default='default',
+                        help='monitor: 無頭、低資源的長時間監控設定')
+    parser.add_argument('--recycle-hours', type=float, default=None,
+                        help='每隔幾小時重新啟動瀏覽器以釋放記憶體')
+    parser.add_argument('--capture', help='把 performance log / CDP 事件錄製到此檔案 (.jsonl.gz)')
+    parser.add_argument('--replay', help='重播錄製檔，不開啟瀏覽器')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='重播速度倍率，0 表示不等待')
+    parser.add_argument('--config', help='以設定檔 (JSON) 執行無介面的常駐模式，見 monitor_config.py')
+    parser.add_argument('--base-url', default=os.environ.get('MONITOR_BASE_URL'),
+                        help='網站基礎URL，未指定時以對話框詢問')
+    parser.add_argument('--username', default=os.environ.get('MONITOR_USERNAME', DEFAULT_USERNAME))
+    parser.add_argument('--password', default=os.environ.get('MONITOR_PASSWORD'),
+                        help='未指定時使用 MONITOR_PASSWORD，兩者都沒有時在終端機詢問')
+    ARGS = parser.parse_args()
+    
+    if ARGS.config or os.environ.get('MONITOR_CONFIG'):
+        from monitor_daemon import run_daemon
+        run_daemon(ARGS.config)
+        raise SystemExit(0)
+    
+    setup_logging()
+    # 日誌、主控台與錯誤記錄改由背景執行緒輸出，監控迴圈只需放進佇列
+    async_logging.start()
+    for name, stats in async_logging.stats_sources().items():
+        get_metrics().add_queue(name, stats)
+    get_metrics().add_queue('error_store', get_default_store().stats)
+    
+    if ARGS.replay:
+        replay_capture(ARGS.replay, ARGS.speed)
+        raise SystemExit(0)
+    
+    CAPTURE = None
+    if ARGS.capture:
+        from replay import CaptureWriter
+        CAPTURE = CaptureWriter(ARGS.capture)
+    PLAYLISTS = [arg for arg in ARGS.streams if '.m3u8' in arg]
+    STREAMS = [arg for arg in ARGS.streams if '.m3u8' not in arg]
+    RECYCLE_INTERVAL = ARGS.recycle_hours * 3600 if ARGS.recycle_hours else None
+    
     # 獲取基礎URL
-    BASE_URL = get_base_url()
+    if ARGS.base_url:
+        BASE_URL = ARGS.base_url.rstrip('/')
+        if not BASE_URL.startswith(('http://', 'https://')):
+            BASE_URL = 'http://' + BASE_URL
+    else:
+        BASE_URL = get_base_url()
     
     # 設定登入資訊
     LOGIN_URL = f'{BASE_URL}/login'
-    TARGET_URL = f'{BASE_URL}/case-live/14'
-    USERNAME = 'admin'
-    PASSWORD = 'mktT0we1'
+    TARGET_URL = f'{BASE_URL}{DEFAULT_TARGET}'
+    USERNAME = ARGS.username
+    PASSWORD = ARGS.password
+    if PASSWORD is None:
+        PASSWORD = getpass.getpass(f'{USERNAME} 的密碼: ')
+    
+    # 串流統計: http://127.0.0.1:9108/metrics 與 logs/stream_metrics.json
+    try:
+        get_metrics().serve(port=9108)
+    except OSError as e:
+        error_logger.error(f'無法啟動統計端點: {str(e)}')
+    get_metrics().report_every('logs/stream_metrics.json', interval=30)
     
     print(f'開始監測網站: {BASE_URL}')
     try:
-        monitor_website(LOGIN_URL, TARGET_URL, USERNAME, PASSWORD)
+        if PLAYLISTS and STREAMS:
+            threading.Thread(
+                target=monitor_playlists,
+                args=(BASE_URL, PLAYLISTS, USERNAME, PASSWORD),
+                daemon=True,
+            ).start()
+        if STREAMS:
+            monitor_streams(LOGIN_URL, BASE_URL, STREAMS, USERNAME, PASSWORD,
+                            profile=ARGS.profile, recycle_interval=RECYCLE_INTERVAL,
+                            capture=CAPTURE)
+        elif PLAYLISTS:
+            monitor_playlists(BASE_URL, PLAYLISTS, USERNAME, PASSWORD)
+        else:
+            monitor_website(LOGIN_URL, TARGET_URL, USERNAME, PASSWORD,
+                            profile=ARGS.profile, recycle_interval=RECYCLE_INTERVAL,
+                            capture=CAPTURE)
     except KeyboardInterrupt:
-        print('\n監測程式已停止')
\ No newline at end of file
+        print('\n監測程式已停止')
+    finally:
+        if CAPTURE is not None:
+            CAPTURE.close()
\ No newline at end of file